@@ -4,7 +4,7 @@ Risk Stratification Web Application
 Flask app to display risk stratification results on localhost
 """
 
-from flask import Flask, render_template, jsonify, request, send_file
+from flask import Flask, render_template, jsonify, request, send_file, Response, stream_with_context
 import pandas as pd
 import sqlite3
 import os
@@ -15,53 +15,103 @@ from reportlab.lib.units import inch
 from reportlab.lib import colors
 from reportlab.lib.enums import TA_CENTER, TA_LEFT
 import io
+import tempfile
 from datetime import datetime
-from risk.db import get_engine
-from risk.model import load_model, predict_batch
+from risk.db import (get_engine, ensure_prediction_columns, query_patient_page, read_risk_summary, append_patients,
+                     get_patient_by_id, patient_cache_stats, MAX_PAGE_SIZE)
+from risk.model import get_model, predict_batch, prediction_cache_stats
 from risk.logger import logger
+from risk.serialize import patient_records, dumps
+from risk.export import EXPORT_FORMATS, iter_export_batches, iter_csv, iter_ndjson, write_parquet
+from risk.http_cache import cached_json_view, response_cache_stats
+from risk.batching import MicroBatcher, DEFAULT_MAX_BATCH_SIZE, DEFAULT_MAX_WAIT_MS
+from risk.jobs import JobRunner
+from risk.scoring import score_table, SCORING_MODES
 from risk.email_service import init_email_service, send_recommendations_email, send_bulk_recommendations_emails
 
 app = Flask(__name__)
 
-def get_database_data(limit=100):
-    """Get data from SQLite database"""
-    try:
-        engine = get_engine()
-        query = f"""
-        SELECT DESYNPUF_ID, AGE, GENDER, TOTAL_CLAIMS_COST, 
-               RISK_30D, RISK_60D, RISK_90D, RISK_LABEL, TOP_3_FEATURES, AI_RECOMMENDATIONS, EMAIL
-        FROM risk_training 
-        ORDER BY RISK_30D DESC 
-        LIMIT {limit}
-        """
-        df = pd.read_sql(query, engine)
-        return df
-    except Exception as e:
-        logger.error(f"Error loading data: {e}")
-        return pd.DataFrame()
+# Concurrent /api/predict calls share one predict_batch per few-millisecond window
+predict_batcher = MicroBatcher(
+    lambda df: predict_batch(df, get_model(), compiled=True),
+    max_batch_size=int(os.getenv('PREDICT_BATCH_MAX_SIZE', DEFAULT_MAX_BATCH_SIZE)),
+    max_wait_ms=float(os.getenv('PREDICT_BATCH_MAX_WAIT_MS', DEFAULT_MAX_WAIT_MS)),
+)
+
+# Long-running work (bulk scoring) runs here, off the request threads
+job_runner = JobRunner()
+
+# Bring the patient table's schema and indexes up to date once per process
+try:
+    ensure_prediction_columns("risk_training")
+except Exception as e:
+    logger.error(f"Schema migration failed at startup: {e}")
+
+def _parse_bool_arg(value):
+    if value is None or value == '':
+        return None
+    return value.lower() in ('1', 'true', 'yes')
+
+def _parse_gender_arg(value):
+    if not value:
+        return None
+    gender = {'male': 1, '1': 1, 'female': 2, '2': 2}.get(value.lower())
+    if gender is None:
+        raise ValueError(f"Invalid gender {value}, use male or female")
+    return gender
+
+def _page_args(args):
+    """Keyset page, sort and filter options from /api/data query args"""
+    labels = [label for value in args.getlist('risk_label') for label in value.split(',') if label]
+    return {
+        'limit': min(max(1, args.get('limit', 100, type=int)), MAX_PAGE_SIZE),
+        'cursor': args.get('cursor') or None,
+        'sort': args.get('sort', 'risk_30d').upper(),
+        'direction': args.get('order', 'desc').lower(),
+        'risk_labels': labels or None,
+        'age_min': args.get('age_min', type=int),
+        'age_max': args.get('age_max', type=int),
+        'gender': _parse_gender_arg(args.get('gender')),
+        'has_email': _parse_bool_arg(args.get('has_email')),
+    }
+
+# Summary keys for each risk label, as returned by /api/summary
+LABEL_SUMMARY_KEYS = {
+    'Very High Risk': 'very_high_risk',
+    'High Risk': 'high_risk',
+    'Moderate Risk': 'moderate_risk',
+    'Low Risk': 'low_risk',
+    'Very Low Risk': 'very_low_risk',
+}
+
+def _mean(total, count):
+    return float(total) / int(count) if count else None
 
 def get_summary_stats():
-    """Get summary statistics"""
-    try:
-        engine = get_engine()
-        query = """
-        SELECT 
-            COUNT(*) as total_patients,
-            AVG(RISK_30D) as avg_risk_30d,
-            AVG(RISK_60D) as avg_risk_60d,
-            AVG(RISK_90D) as avg_risk_90d,
-            COUNT(CASE WHEN RISK_LABEL = 'Very High Risk' THEN 1 END) as very_high_risk,
-            COUNT(CASE WHEN RISK_LABEL = 'High Risk' THEN 1 END) as high_risk,
-            COUNT(CASE WHEN RISK_LABEL = 'Moderate Risk' THEN 1 END) as moderate_risk,
-            COUNT(CASE WHEN RISK_LABEL = 'Low Risk' THEN 1 END) as low_risk,
-            COUNT(CASE WHEN RISK_LABEL = 'Very Low Risk' THEN 1 END) as very_low_risk
-        FROM risk_training
-        """
-        df = pd.read_sql(query, engine)
-        return df.iloc[0].to_dict()
-    except Exception as e:
-        logger.error(f"Error loading summary stats: {e}")
-        return {}
+    """Get summary statistics from the trigger-maintained per-label summary"""
+    summary = read_risk_summary("risk_training")
+    total = int(summary['n'].sum())
+    stats = {
+        'total_patients': total,
+        'avg_risk_30d': _mean(summary['sum_30d'].sum(), summary['n_30d'].sum()),
+        'avg_risk_60d': _mean(summary['sum_60d'].sum(), summary['n_60d'].sum()),
+        'avg_risk_90d': _mean(summary['sum_90d'].sum(), summary['n_90d'].sum()),
+    }
+    counts = dict(zip(summary['RISK_LABEL'], summary['n']))
+    for label, key in LABEL_SUMMARY_KEYS.items():
+        stats[key] = int(counts.get(label, 0))
+
+    # Same breakdown as the risk_summary_*.csv reports, largest label first
+    stats['by_label'] = [{
+        'risk_label': row.RISK_LABEL or 'Unknown',
+        'count': int(row.n),
+        'percentage': round(100.0 * row.n / total, 2),
+        'avg_risk_30d': _mean(row.sum_30d, row.n_30d),
+        'avg_risk_60d': _mean(row.sum_60d, row.n_60d),
+        'avg_risk_90d': _mean(row.sum_90d, row.n_90d),
+        'avg_age': _mean(row.sum_age, row.n_age),
+    } for row in summary.sort_values('n', ascending=False).itertuples()]
+    return stats
 
 @app.route('/')
 def index():
@@ -69,37 +119,37 @@ def index():
     return render_template('index.html')
 
 @app.route('/api/data')
+@cached_json_view
 def get_data():
-    """API endpoint to get patient data"""
-    limit = request.args.get('limit', 100, type=int)
-    df = get_database_data(limit)
-    
-    if df.empty:
-        return jsonify({'error': 'No data available'})
-    
-    # Convert to JSON-friendly format
-    data = []
-    for _, row in df.iterrows():
-        data.append({
-            'patient_id': str(row['DESYNPUF_ID']),
-            'age': int(row['AGE']) if pd.notna(row['AGE']) else 0,
-            'gender': 'Male' if row['GENDER'] == 1 else 'Female',
-            'claims_cost': float(row['TOTAL_CLAIMS_COST']) if pd.notna(row['TOTAL_CLAIMS_COST']) else 0,
-            'risk_30d': int(row['RISK_30D']) if pd.notna(row['RISK_30D']) else 0,
-            'risk_60d': int(row['RISK_60D']) if pd.notna(row['RISK_60D']) else 0,
-            'risk_90d': int(row['RISK_90D']) if pd.notna(row['RISK_90D']) else 0,
-            'risk_label': str(row['RISK_LABEL']) if pd.notna(row['RISK_LABEL']) else 'Unknown',
-            'top_features': str(row['TOP_3_FEATURES']) if pd.notna(row['TOP_3_FEATURES']) else 'N/A',
-            'ai_recommendations': str(row['AI_RECOMMENDATIONS']) if pd.notna(row['AI_RECOMMENDATIONS']) else 'Continue current care plan',
-            'email': str(row['EMAIL']) if pd.notna(row['EMAIL']) else ''
-        })
+    """API endpoint to get one page of patient data.
+
+    Query args: limit (at most MAX_PAGE_SIZE), cursor (next_cursor of the previous
+    page), sort (risk_30d, risk_60d, risk_90d, age, total_claims_cost), order
+    (asc/desc) and the filters risk_label (comma separated), age_min, age_max,
+    gender, has_email.
+    """
+    try:
+        df, next_cursor = query_patient_page("risk_training", **_page_args(request.args))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        # A 5xx is never cached, so the next request retries the database
+        logger.error(f"Error loading data: {e}")
+        return jsonify({'error': 'No data available'}), 500
     
-    return jsonify({'data': data})
+    # Convert to JSON column by column rather than row by row
+    body = dumps({'data': patient_records(df), 'next_cursor': next_cursor})
+    return Response(body, mimetype='application/json')
 
 @app.route('/api/summary')
+@cached_json_view
 def get_summary():
     """API endpoint to get summary statistics"""
-    stats = get_summary_stats()
+    try:
+        stats = get_summary_stats()
+    except Exception as e:
+        logger.error(f"Error loading summary stats: {e}")
+        return jsonify({'error': 'Summary not available'}), 500
     return jsonify(stats)
 
 @app.route('/api/predict', methods=['POST'])
@@ -120,14 +170,12 @@ def predict_single():
                 patient_data = pd.DataFrame([data])
                 
                 # Save new patient data to database first
-                engine = get_engine()
-                patient_data.to_sql('risk_training', engine, if_exists='append', index=False)
+                append_patients(patient_data, 'risk_training')
                 
                 logger.info(f"New patient data saved to database: {data['DESYNPUF_ID']}")
                 
                 # Now make prediction
-                model = load_model("models/risk_model.pkl")
-                predictions = predict_batch(patient_data, model)
+                predictions = predict_batcher.predict(patient_data)
                 prediction_result = predictions.iloc[0].to_dict()
                 
                 # Update the database with predictions
@@ -151,20 +199,15 @@ def predict_single():
             if not desynpuf_id:
                 return jsonify({'error': 'DESYNPUF_ID is required for existing patient prediction'}), 400
             
-            # Load patient data from database
-            engine = get_engine()
-            query = f"""
-            SELECT * FROM risk_training 
-            WHERE DESYNPUF_ID = '{desynpuf_id}'
-            """
-            patient_df = pd.read_sql(query, engine)
+            # Load patient data from database (or the patient cache)
+            patient = get_patient_by_id(desynpuf_id)
             
-            if patient_df.empty:
+            if patient is None:
                 return jsonify({'error': f'Patient with DESYNPUF_ID {desynpuf_id} not found'}), 404
+            patient_df = pd.DataFrame([patient])
             
-            # Load model and predict
-            model = load_model("models/risk_model.pkl")
-            predictions = predict_batch(patient_df, model)
+            # Predict, batched with any concurrent requests
+            predictions = predict_batcher.predict(patient_df)
             
             # Update database with predictions
             from risk.db import update_predictions_in_db
@@ -188,44 +231,61 @@ def predict_single():
 @app.route('/api/health')
 def health_check():
     """Health check endpoint"""
-    return jsonify({'status': 'healthy', 'database': 'connected'})
+    return jsonify({
+        'status': 'healthy',
+        'database': 'connected',
+        'response_cache': response_cache_stats(),
+        'patient_cache': patient_cache_stats(),
+        'predict_batching': predict_batcher.stats(),
+        'prediction_cache': prediction_cache_stats(),
+    })
 
 @app.route('/api/predict-all', methods=['POST'])
 def predict_all_patients():
-    """API endpoint to predict risk for all patients in database"""
+    """API endpoint to start scoring patients in the background.
+
+    The optional JSON body {"mode": ...} picks the rows: "stale" (default) for
+    unscored patients and those whose inputs or model changed since scoring,
+    "unscored" or "all". Returns a job id right away; poll /api/jobs/<job_id>
+    for progress. While a run with the same mode is queued or in progress,
+    further submissions return that same job.
+    """
     try:
-        # Load all patient data from database
-        engine = get_engine()
-        query = """
-        SELECT * FROM risk_training 
-        WHERE RISK_30D IS NULL OR RISK_60D IS NULL OR RISK_90D IS NULL 
-        OR RISK_LABEL IS NULL OR TOP_3_FEATURES IS NULL
-        """
-        patients_df = pd.read_sql(query, engine)
-        
-        if patients_df.empty:
-            return jsonify({'message': 'All patients already have predictions'})
-        
-        # Load model and predict
-        model = load_model("models/risk_model.pkl")
-        predictions = predict_batch(patients_df, model)
-        
-        # Update database with predictions
-        from risk.db import update_predictions_in_db_bulk
-        update_predictions_in_db_bulk(predictions, "risk_training")
-        
-        logger.info(f"Predictions completed and database updated for {len(predictions)} patients")
-        
+        mode = (request.get_json(silent=True) or {}).get('mode', 'stale')
+        if mode not in SCORING_MODES:
+            return jsonify({'error': f"mode must be one of {', '.join(SCORING_MODES)}"}), 400
+
+        # Score the selected patients chunk by chunk, writing back as we go
+        job, created = job_runner.submit(
+            f"predict-all:risk_training:{mode}",
+            lambda progress: score_table("risk_training", get_model(), mode=mode, progress=progress),
+        )
         return jsonify({
             'success': True,
-            'message': f'Database updated for {len(predictions)} patients',
-            'patients_processed': len(predictions)
-        })
+            'job_id': job.id,
+            'status': job.status,
+            'coalesced': not created,
+            'status_url': f'/api/jobs/{job.id}',
+            'message': 'Bulk prediction started' if created else 'Bulk prediction already in progress'
+        }), 202
         
     except Exception as e:
         logger.error(f"Bulk prediction error: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/jobs')
+def list_jobs():
+    """API endpoint to list recent background jobs"""
+    return jsonify({'jobs': [job.to_dict() for job in reversed(job_runner.jobs())]})
+
+@app.route('/api/jobs/<job_id>')
+def get_job(job_id):
+    """API endpoint to get a background job's progress, throughput, ETA and errors"""
+    job = job_runner.get(job_id)
+    if job is None:
+        return jsonify({'error': f'Job {job_id} not found'}), 404
+    return jsonify(job.to_dict())
+
 @app.route('/api/send-recommendations-email', methods=['POST'])
 def send_recommendations_email_endpoint():
     """API endpoint to send recommendations email to a specific patient"""
@@ -236,19 +296,12 @@ def send_recommendations_email_endpoint():
         if not patient_id:
             return jsonify({'error': 'Patient ID is required'}), 400
         
-        # Get patient data from database
-        engine = get_engine()
-        query = f"""
-        SELECT * FROM risk_training 
-        WHERE DESYNPUF_ID = '{patient_id}'
-        """
-        patient_df = pd.read_sql(query, engine)
+        # Get patient data from database (or the patient cache)
+        patient_data = get_patient_by_id(patient_id)
         
-        if patient_df.empty:
+        if patient_data is None:
             return jsonify({'error': f'Patient {patient_id} not found'}), 404
         
-        patient_data = patient_df.iloc[0].to_dict()
-        
         # Send email
         success = send_recommendations_email(patient_data, patient_data.get('AI_RECOMMENDATIONS', ''))
         
@@ -272,7 +325,7 @@ def send_bulk_emails_endpoint():
     """API endpoint to send recommendations emails to all high-risk patients"""
     try:
         # Get all high-risk patients with predictions
-        engine = get_engine()
+        engine = get_engine("read")
         query = """
         SELECT * FROM risk_training 
         WHERE RISK_LABEL IN ('Very High Risk', 'High Risk')
@@ -305,19 +358,12 @@ def send_bulk_emails_endpoint():
 def export_patient_pdf(patient_id):
     """Export individual patient recommendations as PDF"""
     try:
-        # Get patient data
-        engine = get_engine()
-        query = f"""
-        SELECT * FROM risk_training 
-        WHERE DESYNPUF_ID = '{patient_id}'
-        """
-        patient_df = pd.read_sql(query, engine)
+        # Get patient data (from the patient cache when current)
+        patient_data = get_patient_by_id(patient_id)
         
-        if patient_df.empty:
+        if patient_data is None:
             return jsonify({'error': f'Patient {patient_id} not found'}), 404
         
-        patient_data = patient_df.iloc[0]
-        
         # Create PDF
         buffer = io.BytesIO()
         doc = SimpleDocTemplate(buffer, pagesize=A4)
@@ -431,7 +477,6 @@ def send_pdf_email_endpoint():
             return jsonify({'error': 'Patient ID is required'}), 400
         
         # Get patient data
-        from risk.db import get_patient_by_id
         patient_data = get_patient_by_id(patient_id)
         
         if not patient_data:
@@ -518,6 +563,49 @@ def send_pdf_email_endpoint():
         logger.error(f"PDF email sending error: {e}")
         return jsonify({'error': str(e)}), 500
 
+def _iter_file_and_remove(path, chunk_size=64 * 1024):
+    try:
+        with open(path, 'rb') as f:
+            while chunk := f.read(chunk_size):
+                yield chunk
+    finally:
+        os.remove(path)
+
+@app.route('/api/export')
+def export_patients():
+    """API endpoint to stream the scored population as CSV, NDJSON or Parquet.
+
+    Query args: format (csv, ndjson, parquet), risk_label (comma separated), has_email.
+    """
+    fmt = request.args.get('format', 'csv').lower()
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f'Unsupported format {fmt}, use one of {", ".join(EXPORT_FORMATS)}'}), 400
+    labels = [label for value in request.args.getlist('risk_label') for label in value.split(',') if label]
+    filters = {'risk_labels': labels or None, 'has_email': _parse_bool_arg(request.args.get('has_email'))}
+    filename = f"patients_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{fmt}"
+    headers = {'Content-Disposition': f'attachment; filename={filename}'}
+
+    try:
+        batches = iter_export_batches("risk_training", **filters)
+        if fmt == 'csv':
+            return Response(stream_with_context(iter_csv(batches)), mimetype='text/csv', headers=headers)
+        if fmt == 'ndjson':
+            return Response(stream_with_context(iter_ndjson(batches)), mimetype='application/x-ndjson', headers=headers)
+
+        # Parquet needs its footer written before anything can be read, so build the
+        # file batch by batch on disk and stream that
+        fd, path = tempfile.mkstemp(suffix='.parquet')
+        os.close(fd)
+        try:
+            write_parquet(path, batches)
+        except Exception:
+            os.remove(path)
+            raise
+        return Response(_iter_file_and_remove(path), mimetype='application/vnd.apache.parquet', headers=headers)
+    except Exception as e:
+        logger.error(f"Export error: {e}")
+        return jsonify({'error': str(e)}), 500
+
 if __name__ == '__main__':
     # Create templates directory if it doesn't exist
     os.makedirs('templates', exist_ok=True)
@@ -537,5 +625,6 @@ if __name__ == '__main__':
     print("   - Update Email: http://localhost:5000/api/update-patient-email")
     print("   - Bulk Emails: http://localhost:5000/api/send-bulk-emails")
     print("   - Patient PDF: http://localhost:5000/api/export-patient-pdf/<patient_id>")
+    print("   - Export: http://localhost:5000/api/export?format=csv|ndjson|parquet")
     
     app.run(debug=True, host='0.0.0.0', port=5000)
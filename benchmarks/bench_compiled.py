@@ -0,0 +1,48 @@
+"""
+CompiledForest vs. sklearn: single-row latency and 100k-row throughput
+
+Compares raw horizon predictions (predict_risks vs. CompiledForest.predict)
+and end-to-end predict_batch with and without compiled=True, for both engines.
+"""
+
+import argparse
+import contextlib
+import io
+import time
+import numpy as np
+from risk.model import ENGINES, LoadedModel, train_models, model_inputs, predict_risks, predict_batch
+from risk.preprocess import preprocess_features, feature_cols
+from benchmarks.common import make_synthetic_patients, time_calls, describe_latency
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--train-rows", type=int, default=30000)
+    parser.add_argument("--batch-rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    batch_df = make_synthetic_patients(args.batch_rows, seed=11)
+    X = model_inputs(preprocess_features(batch_df)[feature_cols].values)
+    one_df, one_X = batch_df.iloc[:1], X[:1]
+
+    for engine in ENGINES:
+        with contextlib.redirect_stdout(io.StringIO()):
+            model = LoadedModel(train_models(make_synthetic_patients(args.train_rows), engine=engine))
+        compiled = model.compiled()
+        max_diff = np.abs(predict_risks(model, X) - compiled.predict(X)).max()
+        print(f"\n[{engine}] max |sklearn - compiled| over {len(X):,} rows: {max_diff:.2e}")
+
+        describe_latency("  1 row, sklearn forests", time_calls(lambda: predict_risks(model, one_X), args.repeat))
+        describe_latency("  1 row, compiled", time_calls(lambda: compiled.predict(one_X), args.repeat))
+        describe_latency("  1 row predict_batch, sklearn", time_calls(lambda: predict_batch(one_df, model), args.repeat))
+        describe_latency("  1 row predict_batch, compiled", time_calls(lambda: predict_batch(one_df, model, compiled=True), args.repeat))
+
+        for label, fn in (("sklearn forests", lambda: predict_risks(model, X)),
+                          ("compiled", lambda: compiled.predict(X))):
+            start = time.perf_counter()
+            fn()
+            elapsed = time.perf_counter() - start
+            print(f"  {len(X):,} rows, {label:<16} {elapsed:6.3f}s  {len(X) / elapsed:>12,.0f} rows/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Accuracy and throughput of the "separate" vs "multioutput" model engines
+
+Both engines are trained on the same synthetic patients and scored on a
+held-out set: MAE/R² per horizon, raw forest predictions per second and
+end-to-end predict_batch rows per second.
+"""
+
+import argparse
+import contextlib
+import io
+import time
+from sklearn.metrics import mean_absolute_error, r2_score
+from risk.model import ENGINES, LoadedModel, train_models, predict_risks, predict_batch
+from risk.preprocess import preprocess_features, feature_cols, target_cols
+from benchmarks.common import make_synthetic_patients
+
+def rows_per_second(fn, n_rows, repeat=3):
+    best = min(_elapsed(fn) for _ in range(repeat))
+    return n_rows / best
+
+def _elapsed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--train-rows", type=int, default=40000)
+    parser.add_argument("--test-rows", type=int, default=50000)
+    args = parser.parse_args()
+
+    train_df = make_synthetic_patients(args.train_rows, seed=1)
+    test_df = make_synthetic_patients(args.test_rows, seed=2)
+    X_test = preprocess_features(test_df)[feature_cols].values
+    y_test = test_df[target_cols].values
+
+    for engine in ENGINES:
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            model = LoadedModel(train_models(train_df, engine=engine))
+        fit_s = time.perf_counter() - start
+
+        preds = predict_risks(model, X_test)
+        print(f"\n[{engine}] fit {fit_s:.1f}s")
+        for i, col in enumerate(target_cols):
+            mae = mean_absolute_error(y_test[:, i], preds[:, i])
+            r2 = r2_score(y_test[:, i], preds[:, i])
+            print(f"  {col}: MAE={mae:.3f}  R²={r2:.3f}")
+
+        predict_rate = rows_per_second(lambda: predict_risks(model, X_test), len(X_test))
+        batch_rate = rows_per_second(lambda: predict_batch(test_df, model), len(test_df), repeat=1)
+        print(f"  forest predict: {predict_rate:,.0f} rows/s   predict_batch: {batch_rate:,.0f} rows/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Concurrent single-patient predictions: direct predict_batch vs. MicroBatcher
+
+Each of --clients threads sends --requests one-row predictions back to back,
+either calling predict_batch itself or going through a MicroBatcher. Reports
+per-request latency, total throughput and the batcher's batch-size and
+queue-wait statistics, and checks both paths give the same rows.
+"""
+
+import argparse
+import contextlib
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from risk.model import LoadedModel, train_models, predict_batch
+from risk.batching import MicroBatcher
+from benchmarks.common import make_synthetic_patients, describe_latency
+
+def run_clients(fn, rows, clients, requests):
+    """Latencies (ms) of every request and the wall time for all of them"""
+    def client(c):
+        times = []
+        for i in range(requests):
+            row = rows[(c * requests + i) % len(rows)]
+            start = time.perf_counter()
+            fn(row)
+            times.append((time.perf_counter() - start) * 1000)
+        return times
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(clients) as pool:
+        latencies = [t for times in pool.map(client, range(clients)) for t in times]
+    return np.array(latencies), time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--train-rows", type=int, default=20000)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=50, help="requests per client")
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        model = LoadedModel(train_models(make_synthetic_patients(args.train_rows)))
+    patients = make_synthetic_patients(500, seed=9)
+    rows = [patients.iloc[[i]].reset_index(drop=True) for i in range(len(patients))]
+    predict = lambda df: predict_batch(df, model, compiled=True)
+    batcher = MicroBatcher(predict, max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms)
+
+    for row in rows[:20]:
+        assert predict(row).equals(batcher.predict(row)), "batched rows differ"
+
+    total = args.clients * args.requests
+    print(f"{args.clients} clients x {args.requests} one-row requests")
+    for label, fn in (("direct predict_batch", predict), ("micro-batched", batcher.predict)):
+        latencies, wall = run_clients(fn, rows, args.clients, args.requests)
+        describe_latency(f"  {label}", latencies)
+        print(f"  {'':<40} {total / wall:,.0f} requests/s")
+
+    stats = batcher.stats()
+    print(f"\nbatches={stats['batches']}  mean batch size={stats['mean_batch_size']:.1f}  "
+          f"queue wait p50={stats['queue_wait_ms']['p50']:.2f} ms p95={stats['queue_wait_ms']['p95']:.2f} ms")
+    print(f"batch sizes: {stats['batch_sizes']}")
+
+if __name__ == "__main__":
+    main()
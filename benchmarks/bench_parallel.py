@@ -0,0 +1,51 @@
+"""
+Sharded multi-process scoring: throughput at 1/2/4/8 workers
+
+Scores one synthetic frame with predict_batch in-process (1 worker) and through
+a process pool (predict_sharded) to show where scaling saturates. Pool startup,
+which ships the model to every worker once, is reported separately.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import time
+from risk.model import LoadedModel, train_models, predict_batch
+from risk.scoring import make_worker_pool, predict_sharded
+from benchmarks.common import make_synthetic_patients
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        model = LoadedModel(train_models(make_synthetic_patients(20000)))
+    df = make_synthetic_patients(args.rows, seed=5)
+    print(f"{args.rows:,} rows, {os.cpu_count()} CPUs available")
+
+    start = time.perf_counter()
+    expected = predict_batch(df, model)
+    baseline = time.perf_counter() - start
+
+    for workers in args.workers:
+        if workers == 1:
+            elapsed, startup = baseline, 0.0
+        else:
+            start = time.perf_counter()
+            with make_worker_pool(model, workers) as pool:
+                # Warm every worker so startup isn't counted as scoring time
+                list(pool.map(abs, range(workers)))
+                startup = time.perf_counter() - start
+                start = time.perf_counter()
+                result = predict_sharded(df, pool, workers)
+                elapsed = time.perf_counter() - start
+            assert result.equals(expected), "sharded output differs from in-process output"
+
+        print(f"{workers} worker(s): {elapsed:6.2f}s  {args.rows / elapsed:>9,.0f} rows/s  "
+              f"speedup x{baseline / elapsed:.2f}  (pool startup {startup:.2f}s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""
+Single-patient prediction latency: explainer rebuilt per call vs. reused
+
+Times predict_batch on one row - the model part of a /api/predict request -
+with a plain regressors dict (a new TreeExplainer per call, the old
+behaviour) and with a LoadedModel from the registry (explainer built once).
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+from risk.model import train_models, save_model, get_model, load_model, predict_batch
+from benchmarks.common import make_synthetic_patients, time_calls, describe_latency
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--train-rows", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        regressors = train_models(make_synthetic_patients(args.train_rows))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "risk_model.pkl")
+        save_model(regressors, path)
+        plain = load_model(path)
+        cached = get_model(path)
+
+        patient = make_synthetic_patients(1, seed=7)
+        before = describe_latency("per-call TreeExplainer", time_calls(lambda: predict_batch(patient, plain), args.repeat))
+        after = describe_latency("cached TreeExplainer (registry)", time_calls(lambda: predict_batch(patient, cached, cache=None), args.repeat))
+        print(f"p50 speedup x{before[0] / after[0]:.2f}, p99 speedup x{before[1] / after[1]:.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+predict_batch with and without the prediction cache
+
+Builds a frame in which --duplicate-share of the rows repeat another row's
+feature vector (as identical CMS synthetic patients do), then times
+predict_batch uncached, on a cold cache, on a warm in-memory cache and on a
+fresh process's view of a warm SQLite tier. Reports per-batch hit rates and
+checks every cached run returns the uncached rows.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+import pandas as pd
+from risk.model import LoadedModel, PredictionCache, train_models, predict_batch
+from benchmarks.common import make_synthetic_patients
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--train-rows", type=int, default=20000)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--duplicate-share", type=float, default=0.3)
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        model = LoadedModel(train_models(make_synthetic_patients(args.train_rows)), version="bench")
+    distinct = make_synthetic_patients(int(args.rows * (1 - args.duplicate_share)), seed=3)
+    repeats = distinct.sample(args.rows - len(distinct), replace=True, random_state=4)
+    repeats = repeats.assign(DESYNPUF_ID=[f"DUP{i:013d}" for i in range(len(repeats))])
+    df = pd.concat([distinct, repeats], ignore_index=True)
+
+    def timed(cache):
+        start = time.perf_counter()
+        preds = predict_batch(df, model, cache=cache)
+        return preds, time.perf_counter() - start
+
+    expected, base = timed(None)
+    print(f"{len(df)} rows, {len(distinct)} distinct feature vectors")
+    print(f"  {'uncached':<28} {base:7.2f}s")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "prediction_cache.db")
+        memory, disk = PredictionCache(), PredictionCache(path=path)
+        runs = [("cold, memory", memory), ("warm, memory", memory),
+                ("cold, memory + disk", disk), ("warm disk, new process", PredictionCache(path=path))]
+        for label, cache in runs:
+            preds, elapsed = timed(cache)
+            assert preds.equals(expected), f"{label}: cached predictions differ"
+            batch = cache.last_batch
+            print(f"  {label:<28} {elapsed:7.2f}s  x{base / elapsed:5.1f}  "
+                  f"hit rate {batch['hit_rate']:.0%}, {batch['computed']} vectors computed")
+
+if __name__ == "__main__":
+    main()
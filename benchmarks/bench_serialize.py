@@ -0,0 +1,73 @@
+"""
+/api/data serialization: row-by-row iterrows vs. column-wise patient_records
+
+Builds pages shaped like query_patient_page output (with some NULLs) at
+limit=100, 10k and the full table size, checks both paths produce the same
+records, and times records + JSON encoding for each.
+"""
+
+import argparse
+import json
+import numpy as np
+import pandas as pd
+from risk.db import PAGE_COLUMNS
+from risk.serialize import patient_records, dumps, orjson
+from benchmarks.common import make_synthetic_patients, time_calls, describe_latency
+
+def iterrows_records(df):
+    """The original get_data loop, kept as the baseline"""
+    data = []
+    for _, row in df.iterrows():
+        data.append({
+            'patient_id': str(row['DESYNPUF_ID']),
+            'age': int(row['AGE']) if pd.notna(row['AGE']) else 0,
+            'gender': 'Male' if row['GENDER'] == 1 else 'Female',
+            'claims_cost': float(row['TOTAL_CLAIMS_COST']) if pd.notna(row['TOTAL_CLAIMS_COST']) else 0,
+            'risk_30d': int(row['RISK_30D']) if pd.notna(row['RISK_30D']) else 0,
+            'risk_60d': int(row['RISK_60D']) if pd.notna(row['RISK_60D']) else 0,
+            'risk_90d': int(row['RISK_90D']) if pd.notna(row['RISK_90D']) else 0,
+            'risk_label': str(row['RISK_LABEL']) if pd.notna(row['RISK_LABEL']) else 'Unknown',
+            'top_features': str(row['TOP_3_FEATURES']) if pd.notna(row['TOP_3_FEATURES']) else 'N/A',
+            'ai_recommendations': str(row['AI_RECOMMENDATIONS']) if pd.notna(row['AI_RECOMMENDATIONS']) else 'Continue current care plan',
+            'email': str(row['EMAIL']) if pd.notna(row['EMAIL']) else ''
+        })
+    return data
+
+def make_page(n, seed=5):
+    rng = np.random.default_rng(seed)
+    df = make_synthetic_patients(n, seed=seed)
+    df["RISK_LABEL"] = rng.choice(["Very High Risk", "High Risk", "Moderate Risk", "Low Risk", "Very Low Risk"], n)
+    df["TOP_3_FEATURES"] = "AGE, IN_ADM, BP_S"
+    df["AI_RECOMMENDATIONS"] = "Schedule follow-up within 7 days; Review medication adherence"
+    df["EMAIL"] = np.where(rng.random(n) < 0.2, "patient@example.com", None)
+    df = df[PAGE_COLUMNS].copy()
+    # Unscored rows come back from SQLite as NULLs (float columns in pandas)
+    unscored = rng.random(n) < 0.05
+    for col in ("RISK_30D", "RISK_60D", "RISK_90D"):
+        df[col] = df[col].astype(float)
+        df.loc[unscored, col] = np.nan
+    for col in ("RISK_LABEL", "TOP_3_FEATURES", "AI_RECOMMENDATIONS"):
+        df[col] = df[col].astype(object)
+        df.loc[unscored, col] = None
+    return df
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--full-rows", type=int, default=56000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"JSON encoder: {'orjson' if orjson is not None else 'json (orjson not installed)'}")
+    for limit in (100, 10000, args.full_rows):
+        df = make_page(limit)
+        old, new = iterrows_records(df), patient_records(df)
+        assert json.loads(json.dumps(old)) == json.loads(dumps(new)), "records differ"
+
+        repeat = args.repeat if limit <= 10000 else max(3, args.repeat // 4)
+        print(f"\nlimit={limit:,}")
+        old_p50, _ = describe_latency("  iterrows + json.dumps", time_calls(lambda: json.dumps(iterrows_records(df)), repeat, warmup=1))
+        new_p50, _ = describe_latency("  patient_records + dumps", time_calls(lambda: dumps(patient_records(df)), repeat, warmup=1))
+        print(f"  speedup: {old_p50 / new_p50:.1f}x")
+
+if __name__ == "__main__":
+    main()
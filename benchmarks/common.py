@@ -0,0 +1,56 @@
+"""
+Shared helpers for the benchmark scripts: a synthetic patient generator
+shaped like the risk_training table and simple timing utilities.
+Run benchmarks from the repo root, e.g. `python -m benchmarks.bench_predict_latency`.
+"""
+
+import time
+import numpy as np
+import pandas as pd
+from risk.preprocess import chronic_cols
+
+def make_synthetic_patients(n, seed=42):
+    """Random patients with the raw columns preprocess_features/predict_batch expect"""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "DESYNPUF_ID": [f"{i:016X}" for i in rng.choice(16 ** 12, size=n, replace=False)],
+        "AGE": rng.integers(30, 100, n),
+        "GENDER": rng.integers(1, 3, n),
+        "TOTAL_CLAIMS_COST": np.where(rng.random(n) < 0.3, 0, rng.gamma(2.0, 4000, n).round(2)),
+        "IN_ADM": rng.poisson(0.6, n),
+        "OUT_VISITS": rng.poisson(4, n),
+        "ED_VISITS": rng.poisson(0.5, n),
+        "RX_ADH": rng.uniform(0.3, 1.0, n).round(2),
+        "BMI": rng.normal(27, 5, n).round(1),
+        "BP_S": rng.normal(130, 18, n).round(),
+        "GLUCOSE": rng.normal(110, 25, n).round(),
+        "HbA1c": rng.normal(6.0, 1.0, n).round(1),
+        "CHOLESTEROL": rng.normal(195, 35, n).round(),
+    })
+    for c in chronic_cols:
+        df[c] = (rng.random(n) < 0.25).astype(int)
+
+    comor = df[chronic_cols].sum(axis=1)
+    base = (
+        0.5 * (df["AGE"] - 30) + 8 * comor + 6 * df["IN_ADM"]
+        + 0.15 * (df["BP_S"] - 120).clip(lower=0) + 20 * (1 - df["RX_ADH"])
+    )
+    for col, shift in (("RISK_30D", 0), ("RISK_60D", 4), ("RISK_90D", 8)):
+        df[col] = np.clip(base + shift + rng.normal(0, 6, n), 0, 100).round().astype(int)
+    return df
+
+def time_calls(fn, repeat, warmup=3):
+    """Run fn repeatedly and return per-call latencies in milliseconds"""
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return np.array(times)
+
+def describe_latency(label, times_ms):
+    p50, p99 = np.percentile(times_ms, [50, 99])
+    print(f"{label:<40} p50={p50:8.2f} ms   p99={p99:8.2f} ms   (n={len(times_ms)})")
+    return p50, p99
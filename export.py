@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Export scored patients from the database as CSV, NDJSON or Parquet
+
+Rows are streamed from the database in batches, so exporting the whole
+population needs no more memory than exporting a handful of patients.
+
+Examples:
+    python export.py --format csv --risk-label "Very High Risk" --risk-label "High Risk" -o high_risk.csv
+    python export.py --format ndjson --has-email > with_emails.ndjson
+    python export.py --format parquet -o patients.parquet
+"""
+
+import argparse
+import sys
+from risk.export import EXPORT_FORMATS, EXPORT_BATCH_SIZE, iter_export_batches, iter_csv, iter_ndjson, write_parquet
+from risk.logger import logger
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export scored patients as CSV, NDJSON or Parquet")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+    parser.add_argument("-o", "--output", help="output file (default: stdout; required for parquet)")
+    parser.add_argument("--table", default="risk_training")
+    parser.add_argument("--risk-label", action="append", dest="risk_labels",
+                        help="only export this risk label (repeatable)")
+    email = parser.add_mutually_exclusive_group()
+    email.add_argument("--has-email", dest="has_email", action="store_true", default=None,
+                       help="only patients with an email address")
+    email.add_argument("--no-email", dest="has_email", action="store_false",
+                       help="only patients without an email address")
+    parser.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    batches = iter_export_batches(args.table, batch_size=args.batch_size,
+                                  risk_labels=args.risk_labels, has_email=args.has_email)
+
+    if args.format == "parquet":
+        if not args.output:
+            parser.error("--output is required for parquet")
+        rows = write_parquet(args.output, batches)
+        logger.success(f"Wrote {rows} rows to {args.output}")
+    elif args.format == "csv":
+        out = open(args.output, "w", newline="", encoding="utf-8") if args.output else sys.stdout
+        with out:
+            for chunk in iter_csv(batches):
+                out.write(chunk)
+    else:
+        out = open(args.output, "wb") if args.output else sys.stdout.buffer
+        with out:
+            for chunk in iter_ndjson(batches):
+                out.write(chunk)
@@ -69,22 +69,27 @@ if __name__ == "__main__":
     logger.info("Done.")
 """
 
-from risk.model import load_model, predict_batch
-from risk.db import load_data_from_db, update_predictions_in_db
+import argparse
+from risk.model import get_model, MODEL_PATH
+from risk.scoring import score_table, DEFAULT_CHUNK_SIZE, SCORING_MODES
 from risk.logger import logger
 
 if __name__ == "__main__":
-    table_name = "risk_training"
-    logger.info("Loading trained model...")
-    regressors = load_model("models/risk_model.pkl")
-
-    logger.info("Loading new data...")
-    df = load_data_from_db(table_name)
+    parser = argparse.ArgumentParser(description="Score all patients and write the predictions back")
+    parser.add_argument("--table", default="risk_training")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="rows read, scored and written back per step")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="worker processes to shard each chunk across")
+    parser.add_argument("--no-resume", dest="resume", action="store_false",
+                        help="start over instead of continuing an interrupted run from its checkpoint")
+    parser.add_argument("--mode", choices=SCORING_MODES, default="all",
+                        help="rows to score: all, unscored, or stale (changed inputs or another model)")
+    args = parser.parse_args()
 
-    # Ensure prediction columns exist in the database
-    from risk.db import ensure_prediction_columns
-    ensure_prediction_columns(table_name)
-
-    preds = predict_batch(df, regressors)
+    logger.info("Loading trained model...")
+    # Versioned model, so a checkpoint is only resumed with the model that wrote it
+    model = get_model(MODEL_PATH)
 
-    update_predictions_in_db(preds, table_name)
+    score_table(args.table, model, chunk_size=args.chunk_size, workers=args.workers, resume=args.resume,
+                mode=args.mode)
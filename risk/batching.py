@@ -0,0 +1,139 @@
+"""
+Micro-batching for concurrent single-patient predictions
+
+Requests are queued and a background thread gathers them for up to
+max_wait_ms (or until max_batch_size rows), runs one predict call over the
+combined frame and hands every caller back its own rows. The fixed per-call
+cost of the forest and SHAP is then paid once per batch instead of once per
+request.
+"""
+
+import queue
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future
+import numpy as np
+import pandas as pd
+from risk.logger import logger
+
+DEFAULT_MAX_BATCH_SIZE = 32
+DEFAULT_MAX_WAIT_MS = 5.0
+
+class _Request:
+    __slots__ = ("df", "future", "enqueued")
+
+    def __init__(self, df):
+        self.df = df
+        self.future = Future()
+        self.enqueued = time.perf_counter()
+
+class MicroBatcher:
+    """Coalesce concurrent predict_fn(df) calls into one call per batch.
+
+    predict_fn must return one output row per input row, in input order.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait_ms=DEFAULT_MAX_WAIT_MS,
+                 history=1000):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._queue_waits_ms = deque(maxlen=history)
+        self._batch_sizes = Counter()
+        self.requests = 0
+        self.batches = 0
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+                    self._thread.start()
+
+    def submit(self, df: pd.DataFrame) -> Future:
+        """Queue df for the next batch; the future resolves to its prediction rows"""
+        self._ensure_started()
+        request = _Request(df)
+        self._queue.put(request)
+        return request.future
+
+    def predict(self, df: pd.DataFrame, timeout=None) -> pd.DataFrame:
+        return self.submit(df).result(timeout)
+
+    def _collect(self):
+        """Block for a first request, then gather more until the window closes or the batch is full"""
+        batch = [self._queue.get()]
+        rows = len(batch[0].df)
+        deadline = batch[0].enqueued + self.max_wait
+        while rows < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                # Past the deadline, still take whatever queued up while the last batch ran
+                request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(request)
+            rows += len(request.df)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            with self._stats_lock:
+                self.requests += len(batch)
+                self.batches += 1
+                self._batch_sizes[len(batch)] += 1
+                self._queue_waits_ms.extend((started - r.enqueued) * 1000 for r in batch)
+
+            # Requests with different columns (new vs. stored patients) are predicted
+            # separately so concatenation never invents NaN features
+            groups = {}
+            for request in batch:
+                groups.setdefault(tuple(request.df.columns), []).append(request)
+            for requests in groups.values():
+                self._predict_group(requests)
+
+    def _predict_group(self, requests):
+        try:
+            combined = pd.concat([r.df for r in requests], ignore_index=True) if len(requests) > 1 \
+                else requests[0].df.reset_index(drop=True)
+            result = self.predict_fn(combined).reset_index(drop=True)
+        except Exception as e:
+            if len(requests) == 1:
+                requests[0].future.set_exception(e)
+                return
+            # Don't let one bad request fail its neighbours: retry each on its own
+            logger.warning(f"Batched prediction of {len(requests)} requests failed ({e}), retrying individually")
+            for request in requests:
+                self._predict_group([request])
+            return
+
+        offset = 0
+        for request in requests:
+            n = len(request.df)
+            request.future.set_result(result.iloc[offset:offset + n].reset_index(drop=True))
+            offset += n
+
+    def stats(self):
+        """Queue-wait percentiles (ms, over recent requests) and the batch-size distribution"""
+        with self._stats_lock:
+            waits = np.array(self._queue_waits_ms)
+            sizes = dict(sorted(self._batch_sizes.items()))
+            requests, batches = self.requests, self.batches
+        p50, p95, p99 = np.percentile(waits, [50, 95, 99]) if len(waits) else (0.0, 0.0, 0.0)
+        return {
+            "requests": requests,
+            "batches": batches,
+            "mean_batch_size": requests / batches if batches else 0.0,
+            "batch_sizes": sizes,
+            "queue_wait_ms": {"p50": float(p50), "p95": float(p95), "p99": float(p99),
+                              "max": float(waits.max()) if len(waits) else 0.0},
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+        }
@@ -1,22 +1,398 @@
+import base64
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
 import pandas as pd
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import sessionmaker
 from risk.logger import logger
+from risk.cache import LRUCache
+from risk.migrations import (apply_migrations, reset_migrations, table_columns, summary_table_name, ensure_data_version,
+                             PREDICTION_COLUMNS, SCORING_STAMP_COLUMNS, SORTABLE_COLUMNS, LABEL_SORT_COLUMNS)
 DATABASE_URL = "sqlite:///risk_data.db"
 
+# SQLite PRAGMAs applied to every new pooled connection, per access profile.
+# WAL lets readers and a writer work concurrently; NORMAL sync is durable in WAL mode
+# except for the last commits on power loss.
+CONNECTION_PROFILES = {
+    "read": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 512 * 1024 * 1024,
+        "cache_size": -128 * 1024,  # negative = KiB, i.e. 128 MiB
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+    },
+    "write": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64 * 1024,
+        "temp_store": "MEMORY",
+        "busy_timeout": 30000,
+    },
+}
 
-def get_engine():
-    return create_engine(DATABASE_URL)
+_engines = {}
+_engines_lock = threading.Lock()
+
+def _apply_profile(engine, pragmas):
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+def get_engine(profile: str = "write"):
+    """Process-wide engine for a connection profile ("read" or "write"), created once"""
+    engine = _engines.get(profile)
+    if engine is None:
+        with _engines_lock:
+            engine = _engines.get(profile)
+            if engine is None:
+                pragmas = CONNECTION_PROFILES[profile]
+                engine = create_engine(DATABASE_URL)
+                if engine.dialect.name == "sqlite":
+                    _apply_profile(engine, pragmas)
+                _engines[profile] = engine
+    return engine
+
+# Single-row counter that triggers (migration 11) bump in the same transaction as
+# every write to a patient table, whichever process or script makes it. Response
+# caches key on it, so a write is seen on the next read.
+def _data_version(conn):
+    return conn.execute(text("SELECT version FROM data_version WHERE id = 1")).scalar()
+
+def _begin_write(conn):
+    """Take the write lock and return the data version this transaction starts from.
+
+    ensure_data_version's INSERT is a write statement, so it opens the write
+    transaction: no other writer can move the version until this one commits.
+    """
+    ensure_data_version(conn)
+    return _data_version(conn)
+
+def _bump_data_version(conn):
+    ensure_data_version(conn)
+    conn.execute(text("UPDATE data_version SET version = version + 1, updated_at = :now WHERE id = 1"),
+                 {"now": datetime.now(timezone.utc).isoformat(timespec="seconds")})
+    return _data_version(conn)
+
+def bump_data_version():
+    """Mark the data as changed, for changes the triggers do not see (a replaced table)"""
+    with get_engine().begin() as conn:
+        return _bump_data_version(conn)
+
+def get_data_version():
+    """(version, last modified as an aware UTC datetime); (0, None) before the first write"""
+    try:
+        with get_engine("read").connect() as conn:
+            row = conn.execute(text("SELECT version, updated_at FROM data_version WHERE id = 1")).fetchone()
+    except OperationalError:
+        return 0, None
+    if row is None:
+        return 0, None
+    return row[0], datetime.fromisoformat(row[1])
+
+PATIENT_TABLE = "risk_training"
+PATIENT_CACHE_SIZE = 2048
+# Seconds between data version checks: a write from another process or script
+# can be served stale from the patient cache for at most this long
+PATIENT_CACHE_CHECK_INTERVAL = 1.0
+
+class PatientCache:
+    """LRU of PATIENT_TABLE rows by DESYNPUF_ID, kept coherent with the data version.
+
+    Writes through this module drop the rows they touch and carry the cache over
+    to the version they produce. Any other version change (a write from another
+    process, or a script's direct UPDATE) empties the cache at the next check;
+    lookups read the version at most once per check_interval, not on every hit.
+    """
+
+    def __init__(self, maxsize=PATIENT_CACHE_SIZE, check_interval=PATIENT_CACHE_CHECK_INTERVAL):
+        self._rows = LRUCache(maxsize)
+        self._lock = threading.Lock()
+        self.check_interval = check_interval
+        self._checked_at = None
+        self.version = None
+        # Bumped on every invalidation so a lookup that raced a write does not
+        # store the row it read before that write
+        self.generation = 0
+
+    def _due(self):
+        return self._checked_at is None or time.monotonic() - self._checked_at >= self.check_interval
+
+    def sync(self, version):
+        """Empty the cache if the data version moved since it was filled"""
+        with self._lock:
+            self._checked_at = time.monotonic()
+            if version != self.version:
+                self._rows.clear()
+                self.version = version
+                self.generation += 1
+
+    def get(self, patient_id):
+        """(cached row or None, generation to pass to put)"""
+        if self._due():
+            self.sync(get_data_version()[0])
+        with self._lock:
+            return self._rows.get(patient_id), self.generation
+
+    def put(self, patient_id, row, generation):
+        with self._lock:
+            if generation == self.generation:
+                self._rows.put(patient_id, row)
+
+    def invalidate(self, patient_ids=None, before=None, after=None):
+        """Drop the given patients (all when None) after a write that moved the version from before to after"""
+        with self._lock:
+            self.generation += 1
+            if patient_ids is None or len(patient_ids) >= self._rows.maxsize:
+                self._rows.clear()
+            else:
+                for patient_id in patient_ids:
+                    self._rows.pop(patient_id)
+            if after is not None and self.version is not None and self.version == before:
+                self.version = after
+
+    def stats(self):
+        return self._rows.stats()
+
+_patient_cache = PatientCache()
+
+def patient_cache_stats():
+    return _patient_cache.stats()
 
 def load_data_from_db(table_name: str) -> pd.DataFrame:
     logger.info(f"Loading data from {table_name}")
-    engine = get_engine()
+    engine = get_engine("read")
     return pd.read_sql_table(table_name, con=engine)
 
+# Position of a row in a chunked scan: (DESYNPUF_ID, rowid). DESYNPUF_ID alone is not
+# a key, since migration 2 accepts tables with duplicate ids; rowid orders a run of them.
+# The (DESYNPUF_ID) index holds rowid as its last column, so both are read off it.
+SCAN_START = ("", 0)
+# Largest SQLite rowid: (id, MAX_ROWID) is the position after every row with that id
+MAX_ROWID = 2 ** 63 - 1
+
+def count_rows(table_name: str, where: str = None, after=None) -> int:
+    """Rows matching where, optionally only those after the (DESYNPUF_ID, rowid) position after"""
+    engine = get_engine("read")
+    conditions = ([f"({where})"] if where else []) + (["(DESYNPUF_ID, rowid) > (:after_id, :after_rowid)"] if after else [])
+    query = f"SELECT COUNT(*) FROM {table_name}" + (f" WHERE {' AND '.join(conditions)}" if conditions else "")
+    params = {"after_id": after[0], "after_rowid": after[1]} if after else {}
+    with engine.connect() as conn:
+        return conn.execute(text(query), params).scalar()
+
+def chunk_position(chunk: pd.DataFrame):
+    """(DESYNPUF_ID, rowid) of the last row of a chunk from iter_table_chunks"""
+    return chunk["DESYNPUF_ID"].iloc[-1], int(chunk.index[-1])
+
+def iter_table_chunks(table_name: str, chunk_size: int = 5000, where: str = None, after=SCAN_START):
+    """Yield the table as DataFrames of at most chunk_size rows, in (DESYNPUF_ID, rowid) order.
+
+    Each chunk is its own keyset query (position > last position seen), so no
+    cursor stays open between chunks and callers can write back to the table as
+    they go. Chunks are indexed by rowid. after starts the scan after that
+    position (see chunk_position), to resume an interrupted pass.
+    """
+    engine = get_engine("read")
+    condition = f"AND ({where})" if where else ""
+    query = text(f"""
+        SELECT rowid AS _rowid, * FROM {table_name}
+        WHERE (DESYNPUF_ID, rowid) > (:last_id, :last_rowid) {condition}
+        ORDER BY DESYNPUF_ID, rowid
+        LIMIT :chunk_size
+    """)
+    last_id, last_rowid = after
+    while True:
+        chunk = pd.read_sql(query, engine, index_col="_rowid",
+                            params={"last_id": last_id, "last_rowid": last_rowid, "chunk_size": chunk_size})
+        if chunk.empty:
+            return
+        chunk.index.name = "rowid"
+        yield chunk
+        last_id, last_rowid = chunk_position(chunk)
+        if len(chunk) < chunk_size:
+            return
+
+def read_scoring_checkpoint(table_name: str, scope: str):
+    """Last checkpoint of a chunked scoring run over table_name/scope, or None"""
+    with get_engine("read").connect() as conn:
+        row = conn.execute(
+            text("SELECT last_id, last_rowid, model_version, status, rows_done FROM scoring_checkpoints "
+                 "WHERE table_name = :table AND scope = :scope"),
+            {"table": table_name, "scope": scope},
+        ).fetchone()
+    return dict(row._mapping) if row else None
+
+def write_scoring_checkpoint(table_name: str, scope: str, position, model_version, status: str, rows_done: int):
+    """Record the (DESYNPUF_ID, rowid) position a chunked scoring run has got to"""
+    last_id, last_rowid = position
+    with get_engine().begin() as conn:
+        conn.execute(
+            text("INSERT INTO scoring_checkpoints "
+                 "(table_name, scope, last_id, last_rowid, model_version, status, rows_done, updated_at) "
+                 "VALUES (:table, :scope, :last_id, :last_rowid, :model_version, :status, :rows_done, :now) "
+                 "ON CONFLICT(table_name, scope) DO UPDATE SET last_id = excluded.last_id, "
+                 "last_rowid = excluded.last_rowid, model_version = excluded.model_version, "
+                 "status = excluded.status, rows_done = excluded.rows_done, updated_at = excluded.updated_at"),
+            {"table": table_name, "scope": scope, "last_id": last_id, "last_rowid": last_rowid,
+             "model_version": model_version,
+             "status": status, "rows_done": rows_done,
+             "now": datetime.now(timezone.utc).isoformat(timespec="seconds")},
+        )
+
+# Columns returned for each dashboard row
+PAGE_COLUMNS = [
+    "DESYNPUF_ID", "AGE", "GENDER", "TOTAL_CLAIMS_COST",
+    "RISK_30D", "RISK_60D", "RISK_90D", "RISK_LABEL", "TOP_3_FEATURES", "AI_RECOMMENDATIONS", "EMAIL",
+]
+# Largest page /api/data serves; bigger limits are capped to it
+MAX_PAGE_SIZE = 1000
+
+def encode_cursor(sort_value, patient_id) -> str:
+    """Opaque page cursor for the last row served: its sort value (None = NULL) and id"""
+    if sort_value is not None and pd.isna(sort_value):
+        sort_value = None
+    elif hasattr(sort_value, "item"):
+        sort_value = sort_value.item()
+    raw = json.dumps([sort_value, str(patient_id)]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    """Inverse of encode_cursor; raises ValueError for anything it did not produce"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        sort_value, patient_id = json.loads(raw)
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(patient_id, str) or not (sort_value is None or isinstance(sort_value, (int, float))):
+        raise ValueError("Invalid cursor")
+    return sort_value, patient_id
+
+def patient_filters(risk_labels=None, age_min=None, age_max=None, gender=None, has_email=None, walk=None):
+    """WHERE clauses and bind params for the dashboard/export patient filters.
+
+    walk names the column whose index the query is meant to walk. Every other
+    filter column is then written as +col, which SQLite cannot match to an index,
+    so it checks those filters on the walk instead of seeking another index
+    and sorting what it finds.
+    """
+    def col(name):
+        return name if walk is None or name == walk else f"+{name}"
+
+    clauses, params = [], {}
+    if risk_labels:
+        names = [f"label_{i}" for i in range(len(risk_labels))]
+        clauses.append(f"{col('RISK_LABEL')} IN ({', '.join(':' + n for n in names)})")
+        params.update(zip(names, risk_labels))
+    if age_min is not None:
+        clauses.append(f"{col('AGE')} >= :age_min")
+        params["age_min"] = age_min
+    if age_max is not None:
+        clauses.append(f"{col('AGE')} <= :age_max")
+        params["age_max"] = age_max
+    if gender is not None:
+        clauses.append(f"{col('GENDER')} = :gender")
+        params["gender"] = gender
+    if has_email is True:
+        clauses.append(f"{col('EMAIL')} IS NOT NULL AND {col('EMAIL')} != ''")
+    elif has_email is False:
+        clauses.append(f"({col('EMAIL')} IS NULL OR {col('EMAIL')} = '')")
+    return clauses, params
+
+def _page_query(table_name, partitions, clauses, order):
+    """SELECT for one keyset step: a single index walk, or one walk per partition
+    (e.g. per risk label) merged in sort order, each reading at most :limit rows"""
+    columns = ", ".join(PAGE_COLUMNS)
+    arms = [f"SELECT {columns} FROM {table_name} WHERE {' AND '.join(clauses + ([p] if p else []))} "
+            f"ORDER BY {order} LIMIT :limit" for p in partitions]
+    if len(arms) == 1:
+        return text(arms[0])
+    union = " UNION ALL ".join(f"SELECT * FROM ({arm})" for arm in arms)
+    return text(f"{union} ORDER BY {order} LIMIT :limit")
+
+def query_patient_page(table_name: str = "risk_training", limit: int = 100, cursor: str = None,
+                       sort: str = "RISK_30D", direction: str = "desc", risk_labels=None, **filters):
+    """One page of patients ordered by sort column, continuing after cursor.
+
+    Pages are keyset queries on (sort value, DESYNPUF_ID): each one seeks the sort
+    column's index at the cursor, so the cost of a page does not depend on how deep
+    it is. Ties break on DESYNPUF_ID in the opposite direction to the sort, which is
+    the order the (col DESC, DESYNPUF_ID) indexes already hold in both directions.
+    Rows with a NULL sort value come last, in DESYNPUF_ID order, as a second phase
+    of the same keyset. Returns (DataFrame, next cursor or None).
+
+    With the default sort, each risk label is walked on its own (RISK_LABEL,
+    RISK_30D, id) index and the walks are merged. Every other filter is checked
+    on the sort index walk, so a page over a rare filter value reads further
+    down the index to fill up. That includes an age range, except with sort=AGE
+    where it bounds the seek itself.
+    """
+    if sort not in SORTABLE_COLUMNS:
+        raise ValueError(f"Cannot sort by {sort}")
+    if direction not in ("asc", "desc"):
+        raise ValueError(f"Invalid sort direction {direction}")
+
+    engine = get_engine("read")
+    partitions = [None]
+    if risk_labels and sort in LABEL_SORT_COLUMNS:
+        partitions = [f"RISK_LABEL = :label_{i}" for i in range(len(risk_labels))]
+        filter_clauses, params = patient_filters(walk=sort, **filters)
+        params.update((f"label_{i}", label) for i, label in enumerate(risk_labels))
+    else:
+        filter_clauses, params = patient_filters(risk_labels=risk_labels, walk=sort, **filters)
+    sort_value, last_id = decode_cursor(cursor) if cursor else (None, None)
+    in_null_phase = cursor is not None and sort_value is None
+
+    frames = []
+    remaining = limit
+    if not in_null_phase:
+        clauses = [f"{sort} IS NOT NULL"] + filter_clauses
+        page_params = dict(params, limit=remaining)
+        if cursor is not None:
+            if direction == "desc":
+                clauses += [f"{sort} <= :value", f"({sort} < :value OR DESYNPUF_ID > :last_id)"]
+            else:
+                clauses += [f"{sort} >= :value", f"({sort} > :value OR DESYNPUF_ID < :last_id)"]
+            page_params.update(value=sort_value, last_id=last_id)
+        order = f"{sort} DESC, DESYNPUF_ID ASC" if direction == "desc" else f"{sort} ASC, DESYNPUF_ID DESC"
+        query = _page_query(table_name, partitions, clauses, order)
+        frames.append(pd.read_sql(query, engine, params=page_params))
+        remaining -= len(frames[-1])
+        last_id = None
+
+    if remaining > 0:
+        clauses = [f"{sort} IS NULL"] + filter_clauses
+        page_params = dict(params, limit=remaining)
+        if last_id is not None:
+            clauses.append("DESYNPUF_ID > :last_id")
+            page_params["last_id"] = last_id
+        query = _page_query(table_name, partitions, clauses, "DESYNPUF_ID")
+        frames.append(pd.read_sql(query, engine, params=page_params))
+
+    frames = [frame for frame in frames if not frame.empty]
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=PAGE_COLUMNS)
+    next_cursor = None
+    if len(df) == limit:
+        last = df.iloc[-1]
+        next_cursor = encode_cursor(last[sort], last["DESYNPUF_ID"])
+    return df, next_cursor
+
+def read_risk_summary(table_name: str = "risk_training") -> pd.DataFrame:
+    """Per-label counts and running sums kept by the summary triggers (one row per label)"""
+    engine = get_engine("read")
+    return pd.read_sql(f"SELECT * FROM {summary_table_name(table_name)} WHERE n > 0", engine)
+
 def load_patient_data() -> pd.DataFrame:
     """Load patient data from the database"""
     logger.info("Loading patient data from database")
-    engine = get_engine()
+    engine = get_engine("read")
     try:
         # Try to load from beneficiary table first
         df = pd.read_sql_table("beneficiary", con=engine)
@@ -29,100 +405,135 @@ def load_patient_data() -> pd.DataFrame:
         logger.info(f"Loaded {len(df)} rows from CSV fallback")
         return df
 
+# Column names per table, read with one PRAGMA table_info per table per process.
+# Only this process changes the schema, so entries are dropped when a migration or
+# ALTER runs here (or the table is recreated) and never expire otherwise.
+_schema_cache = {}
+_REQUIRED_COLUMNS = frozenset(column_def.split()[0] for column_def in PREDICTION_COLUMNS + SCORING_STAMP_COLUMNS)
+
+def get_table_columns(table_name: str) -> frozenset:
+    """Column names of table_name, from the per-process schema cache"""
+    columns = _schema_cache.get(table_name)
+    if columns is None:
+        with get_engine("read").connect() as conn:
+            columns = frozenset(table_columns(conn, table_name))
+        if columns:
+            _schema_cache[table_name] = columns
+    return columns
+
+def invalidate_schema_cache(table_name: str = None):
+    """Forget cached columns for one table, or for all tables"""
+    if table_name is None:
+        _schema_cache.clear()
+    else:
+        _schema_cache.pop(table_name, None)
+
 def ensure_prediction_columns(table_name):
-    """Ensure prediction-related columns exist in the table"""
+    """Ensure prediction-related columns (and the rest of the schema) exist in the table"""
+    # Hot path: schema already migrated in this process, no catalog queries at all
+    if _REQUIRED_COLUMNS <= _schema_cache.get(table_name, frozenset()):
+        return
     try:
-        engine = get_engine()
-        
-        # Columns to add if they don't exist
-        columns_to_add = [
-            "RISK_30D INTEGER",
-            "RISK_60D INTEGER", 
-            "RISK_90D INTEGER",
-            "RISK_LABEL TEXT",
-            "TOP_3_FEATURES TEXT",
-            "AI_RECOMMENDATIONS TEXT",
-            "EMAIL TEXT"
-        ]
-        
-        with engine.connect() as conn:
-            for column_def in columns_to_add:
-                column_name = column_def.split()[0]
-                try:
-                    # Check if column exists
-                    query = text(f"SELECT {column_name} FROM {table_name} LIMIT 1")
-                    conn.execute(query)
-                except:
-                    # Column doesn't exist, add it
-                    alter_query = text(f"ALTER TABLE {table_name} ADD COLUMN {column_def}")
-                    conn.execute(alter_query)
-                    conn.commit()
-                    logger.info(f"Added column {column_name} to {table_name}")
-                
+        if apply_migrations(get_engine(), table_name):
+            invalidate_schema_cache(table_name)
+        get_table_columns(table_name)
     except Exception as e:
         logger.error(f"Error ensuring prediction columns: {e}")
         raise
 
-def update_predictions_in_db(df: pd.DataFrame, table_name: str):
+# Prediction columns written back by the update helpers, with their staging types
+PREDICTION_WRITE_COLUMNS = {
+    "RISK_30D": "INTEGER",
+    "RISK_60D": "INTEGER",
+    "RISK_90D": "INTEGER",
+    "RISK_LABEL": "TEXT",
+    "TOP_3_FEATURES": "TEXT",
+    "FEATURE_HASH": "TEXT",
+    "MODEL_VERSION": "TEXT",
+}
+
+def _write_predictions(df: pd.DataFrame, table_name: str) -> float:
+    """Stage predictions in a temp table with one executemany, then apply them with a
+    single joined UPDATE, all in one transaction. Returns the elapsed seconds."""
+    start = time.perf_counter()
+    columns = list(PREDICTION_WRITE_COLUMNS)
+    # Predictions without stamps are written with NULL ones, i.e. due for rescoring
+    missing = [None] * len(df)
+    rows = [
+        {"DESYNPUF_ID": pid, "RISK_30D": r30, "RISK_60D": r60, "RISK_90D": r90,
+         "RISK_LABEL": label, "TOP_3_FEATURES": features, "FEATURE_HASH": fingerprint,
+         "MODEL_VERSION": model_version}
+        for pid, r30, r60, r90, label, features, fingerprint, model_version in zip(
+            df["DESYNPUF_ID"].tolist(),
+            df["RISK_30D"].astype(int).tolist(),
+            df["RISK_60D"].astype(int).tolist(),
+            df["RISK_90D"].astype(int).tolist(),
+            df["RISK_LABEL"].tolist(),
+            df["TOP_3_FEATURES"].tolist(),
+            df["FEATURE_HASH"].tolist() if "FEATURE_HASH" in df else missing,
+            df["MODEL_VERSION"].tolist() if "MODEL_VERSION" in df else missing,
+        )
+    ]
+
+    staging_columns = ", ".join(f"{col} {sql_type}" for col, sql_type in PREDICTION_WRITE_COLUMNS.items())
+    if sqlite3.sqlite_version_info >= (3, 33, 0):
+        apply_sql = f"""
+            UPDATE {table_name}
+            SET {", ".join(f"{col} = s.{col}" for col in columns)}
+            FROM prediction_staging AS s
+            WHERE {table_name}.DESYNPUF_ID = s.DESYNPUF_ID
+        """
+    else:
+        # No UPDATE ... FROM before SQLite 3.33: row-value correlated subquery instead
+        apply_sql = f"""
+            UPDATE {table_name}
+            SET ({", ".join(columns)}) = (
+                SELECT {", ".join(columns)} FROM prediction_staging AS s
+                WHERE s.DESYNPUF_ID = {table_name}.DESYNPUF_ID
+            )
+            WHERE DESYNPUF_ID IN (SELECT DESYNPUF_ID FROM prediction_staging)
+        """
+
+    versions = None
     engine = get_engine()
     with engine.begin() as conn:
-        for _, row in df.iterrows():
+        # Temp tables live per connection; pooled connections may already have one
+        conn.execute(text(f"CREATE TEMP TABLE IF NOT EXISTS prediction_staging "
+                          f"(DESYNPUF_ID TEXT PRIMARY KEY, {staging_columns})"))
+        conn.execute(text("DELETE FROM prediction_staging"))
+        if rows:
+            before = _begin_write(conn)
+            # OR REPLACE: a repeated patient id keeps its last prediction, as sequential UPDATEs would
             conn.execute(
-                text(f"""
-                    UPDATE {table_name}
-                    SET RISK_30D = :r30,
-                        RISK_60D = :r60,
-                        RISK_90D = :r90,
-                        RISK_LABEL = :rlabel,
-                        TOP_3_FEATURES = :features
-                    WHERE DESYNPUF_ID = :pid
-                """),
-                {
-                    "r30": int(row["RISK_30D"]),
-                    "r60": int(row["RISK_60D"]),
-                    "r90": int(row["RISK_90D"]),
-                    "rlabel": row["RISK_LABEL"],
-                    "features": row["TOP_3_FEATURES"],
-                    "pid": row["DESYNPUF_ID"]
-                }
+                text(f"INSERT OR REPLACE INTO prediction_staging (DESYNPUF_ID, {', '.join(columns)}) "
+                     f"VALUES (:DESYNPUF_ID, {', '.join(':' + col for col in columns)})"),
+                rows,
             )
-    logger.success("Predictions updated successfully in DB")
+            conn.execute(text(apply_sql))
+            versions = before, _data_version(conn)
+        conn.execute(text("DELETE FROM prediction_staging"))
+    if versions is not None and table_name == PATIENT_TABLE:
+        _patient_cache.invalidate(df["DESYNPUF_ID"].tolist(), *versions)
+    return time.perf_counter() - start
+
+def update_predictions_in_db(df: pd.DataFrame, table_name: str):
+    elapsed = _write_predictions(df, table_name)
+    logger.success(f"Predictions updated successfully in DB ({len(df)} rows, {len(df) / max(elapsed, 1e-9):.0f} rows/s)")
 
 def update_predictions_in_db_bulk(df: pd.DataFrame, table_name: str):
     """Bulk update predictions in the database"""
     logger.info(f"Bulk updating predictions for {len(df)} records in {table_name}")
-    engine = get_engine()
     
     # Ensure prediction columns exist
     ensure_prediction_columns(table_name)
     
-    with engine.begin() as conn:
-        for _, row in df.iterrows():
-            try:
-                conn.execute(
-                    text(f"""
-                        UPDATE {table_name}
-                        SET RISK_30D = :r30,
-                            RISK_60D = :r60,
-                            RISK_90D = :r90,
-                            RISK_LABEL = :rlabel,
-                            TOP_3_FEATURES = :features
-                        WHERE DESYNPUF_ID = :pid
-                    """),
-                    {
-                        "r30": int(row["RISK_30D"]),
-                        "r60": int(row["RISK_60D"]),
-                        "r90": int(row["RISK_90D"]),
-                        "rlabel": row["RISK_LABEL"],
-                        "features": row["TOP_3_FEATURES"],
-                        "pid": row["DESYNPUF_ID"]
-                    }
-                )
-            except Exception as e:
-                logger.warning(f"Failed to update row {row['DESYNPUF_ID']}: {e}")
-                continue
+    try:
+        elapsed = _write_predictions(df, table_name)
+    except Exception as e:
+        logger.error(f"Bulk update of {len(df)} records in {table_name} failed, nothing was written: {e}")
+        raise
     
-    logger.success(f"Bulk update completed for {len(df)} records")
+    logger.success(f"Bulk update completed for {len(df)} records in {elapsed:.2f}s ({len(df) / max(elapsed, 1e-9):.0f} rows/s)")
 
 def create_table_from_csv(csv_path: str, table_name: str):
     """Create a SQLite table from CSV data"""
@@ -133,6 +544,15 @@ def create_table_from_csv(csv_path: str, table_name: str):
         df = pd.read_csv(csv_path)
         df.to_sql(table_name, engine, if_exists='replace', index=False)
         logger.success(f"Table {table_name} created with {len(df)} rows")
+
+        # Replacing the table dropped its indexes, so start its migrations over
+        invalidate_schema_cache(table_name)
+        reset_migrations(engine, table_name)
+        if "DESYNPUF_ID" in df.columns:
+            apply_migrations(engine, table_name)
+        bump_data_version()
+        if table_name == PATIENT_TABLE:
+            _patient_cache.invalidate()
         return True
     except Exception as e:
         logger.error(f"Failed to create table {table_name}: {e}")
@@ -151,11 +571,14 @@ def update_patient_email(patient_id, email):
         """)
         
         with engine.connect() as conn:
+            before = _begin_write(conn)
             conn.execute(update_query, {
                 "email": email,
                 "patient_id": patient_id
             })
+            after = _data_version(conn)
             conn.commit()
+        _patient_cache.invalidate([patient_id], before, after)
         
         logger.info(f"Email updated for patient {patient_id}: {email}")
         return True
@@ -164,12 +587,25 @@ def update_patient_email(patient_id, email):
         logger.error(f"Error updating email for patient {patient_id}: {e}")
         return False
 
+def append_patients(df: pd.DataFrame, table_name: str = "risk_training"):
+    """Insert new patient rows into the table"""
+    with get_engine().begin() as conn:
+        before = _begin_write(conn)
+        df.to_sql(table_name, conn, if_exists='append', index=False)
+        after = _data_version(conn)
+    if table_name == PATIENT_TABLE:
+        _patient_cache.invalidate(df["DESYNPUF_ID"].tolist() if "DESYNPUF_ID" in df else None, before, after)
+
 def get_patient_by_id(patient_id):
-    """Get patient data by ID"""
+    """Get patient data by ID as a dict (a private copy; served from the patient cache when current)"""
     try:
-        engine = get_engine()
+        cached, generation = _patient_cache.get(patient_id)
+        if cached is not None:
+            return dict(cached)
+
+        engine = get_engine("read")
         query = text(f"""
-            SELECT * FROM risk_training 
+            SELECT * FROM {PATIENT_TABLE} 
             WHERE DESYNPUF_ID = :patient_id
         """)
         
@@ -178,7 +614,9 @@ def get_patient_by_id(patient_id):
             row = result.fetchone()
             
             if row:
-                return dict(row)
+                record = dict(row._mapping)
+                _patient_cache.put(patient_id, record, generation)
+                return dict(record)
             else:
                 return None
             
@@ -0,0 +1,98 @@
+"""
+Streaming exports of the scored patient population
+
+Rows are read from a DB cursor in fixed-size batches and written out as CSV,
+NDJSON or (with pyarrow installed) Parquet, so memory stays bounded by one
+batch whatever the size of the export.
+"""
+
+import csv
+import io
+from sqlalchemy import text
+from risk.db import get_engine, patient_filters
+from risk.serialize import dumps
+from risk.logger import logger
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+EXPORT_FORMATS = ("csv", "ndjson", "parquet")
+EXPORT_BATCH_SIZE = 2000
+
+# Exported columns with their Parquet types. Numbers are float64: SQLite keeps
+# whatever a row was written with (tables loaded from CSV hold REAL ages and risks,
+# whatever the declared type), and an int64 column would truncate 99.5 to 99.
+EXPORT_COLUMNS = {
+    "DESYNPUF_ID": "string",
+    "AGE": "float64",
+    "GENDER": "float64",
+    "TOTAL_CLAIMS_COST": "float64",
+    "RISK_30D": "float64",
+    "RISK_60D": "float64",
+    "RISK_90D": "float64",
+    "RISK_LABEL": "string",
+    "TOP_3_FEATURES": "string",
+    "AI_RECOMMENDATIONS": "string",
+    "EMAIL": "string",
+}
+
+def iter_export_batches(table_name: str = "risk_training", batch_size: int = EXPORT_BATCH_SIZE,
+                        risk_labels=None, **filters):
+    """Yield lists of row tuples (EXPORT_COLUMNS order), ordered by RISK_30D DESC.
+
+    Every query walks a RISK_30D index in order, so SQLite streams rows off it
+    instead of sorting the whole export first. With risk_labels, each label is
+    walked in turn on its (RISK_LABEL, RISK_30D) index: rows come grouped by
+    label, in the order given, and by RISK_30D DESC within a label.
+    """
+    clauses, params = patient_filters(walk="RISK_30D", **filters)
+    labels = list(dict.fromkeys(risk_labels)) if risk_labels else [None]
+    rows = 0
+    with get_engine("read").connect() as conn:
+        for label in labels:
+            where = clauses + (["RISK_LABEL = :label"] if label is not None else [])
+            query = text(f"SELECT {', '.join(EXPORT_COLUMNS)} FROM {table_name} "
+                         f"{'WHERE ' + ' AND '.join(where) if where else ''} "
+                         f"ORDER BY RISK_30D DESC, DESYNPUF_ID")
+            result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(
+                query, dict(params, label=label))
+            for batch in result.partitions(batch_size):
+                rows += len(batch)
+                yield [tuple(row) for row in batch]
+    logger.info(f"Exported {rows} rows from {table_name}")
+
+def iter_csv(batches):
+    """CSV text chunks: a header, then one chunk per batch"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def iter_ndjson(batches):
+    """NDJSON bytes chunks, one JSON object per row"""
+    keys = list(EXPORT_COLUMNS)
+    for batch in batches:
+        yield b"".join(dumps(dict(zip(keys, row))) + b"\n" for row in batch)
+
+def write_parquet(path: str, batches) -> int:
+    """Write batches to a Parquet file one row group at a time; returns the row count"""
+    if pq is None:
+        raise RuntimeError("Parquet export needs pyarrow: pip install pyarrow")
+    schema = pa.schema([(name, getattr(pa, dtype)()) for name, dtype in EXPORT_COLUMNS.items()])
+    rows = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        for batch in batches:
+            columns = list(zip(*batch))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema))
+            rows += len(batch)
+    return rows
@@ -0,0 +1,81 @@
+"""
+Conditional, cached and compressed responses for the read-only dashboard APIs
+
+Responses are cached in memory keyed by endpoint, query args and the database
+data version, so they are rebuilt only after a write. Clients revalidate with
+ETag / Last-Modified and get a 304 when nothing changed; large bodies are
+gzip-compressed once, when cached. Bodies over MAX_CACHED_BODY_BYTES are served
+as built and never cached.
+"""
+
+import gzip
+import hashlib
+from functools import wraps
+from flask import request, make_response, Response
+from risk.cache import LRUCache
+from risk.db import get_data_version
+
+GZIP_MIN_BYTES = 1024
+RESPONSE_CACHE_SIZE = 256
+# Largest body kept in the cache: bounds its memory at RESPONSE_CACHE_SIZE times this
+MAX_CACHED_BODY_BYTES = 1024 * 1024
+
+_responses = LRUCache(RESPONSE_CACHE_SIZE)
+
+def response_cache_stats():
+    return _responses.stats()
+
+def clear_response_cache():
+    _responses.clear()
+
+def _cache_entry(view, args, kwargs, version):
+    """Run the view and keep its body, gzipped body and ETag; None if it should not be cached.
+
+    Only 200s are kept: views must report failures with an error status, or the
+    failure would be served from the cache until the next write.
+    """
+    response = make_response(view(*args, **kwargs))
+    if response.status_code != 200 or response.is_streamed:
+        return response, None
+    body = response.get_data()
+    if len(body) > MAX_CACHED_BODY_BYTES:
+        return response, None
+    compressed = gzip.compress(body, compresslevel=6) if len(body) >= GZIP_MIN_BYTES else None
+    etag = f"{version}-{hashlib.sha1(body).hexdigest()[:16]}"
+    return response, (body, compressed, response.mimetype, etag)
+
+def cached_json_view(view):
+    """Serve view through the response cache with ETag/Last-Modified revalidation and gzip"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        version, modified = get_data_version()
+        key = (request.endpoint, tuple(sorted(request.args.items(multi=True))), version)
+        entry = _responses.get(key)
+        if entry is None:
+            response, entry = _cache_entry(view, args, kwargs, version)
+            if entry is None:
+                return response
+            _responses.put(key, entry)
+        body, compressed, mimetype, etag = entry
+
+        # Weak ETag: the gzip and identity bodies are the same representation
+        if request.if_none_match:
+            not_modified = request.if_none_match.contains_weak(etag)
+        else:
+            since = request.if_modified_since
+            not_modified = since is not None and modified is not None and modified.replace(microsecond=0) <= since
+        if not_modified:
+            response = Response(status=304)
+        elif compressed is not None and "gzip" in request.accept_encodings:
+            response = Response(compressed, mimetype=mimetype)
+            response.headers["Content-Encoding"] = "gzip"
+        else:
+            response = Response(body, mimetype=mimetype)
+
+        response.set_etag(etag, weak=True)
+        if modified is not None:
+            response.last_modified = modified
+        response.headers["Cache-Control"] = "no-cache"
+        response.vary.add("Accept-Encoding")
+        return response
+    return wrapper
@@ -0,0 +1,115 @@
+"""
+Background job runner for long-running work started from the web app
+
+Jobs run on a small thread pool so the HTTP request that starts one returns
+immediately with a job id. Each job records its progress (rows done / total),
+from which throughput and ETA are derived. Submitting a job whose key matches
+one still queued or running returns that job instead of starting another.
+"""
+
+import itertools
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from risk.logger import logger
+
+JOB_HISTORY = 100
+
+class Job:
+    """State of one background job; fn is called as fn(progress=job.update_progress)"""
+
+    def __init__(self, key, fn):
+        self.id = uuid.uuid4().hex[:12]
+        self.key = key
+        self.fn = fn
+        self.status = "queued"
+        self.submitted_at = datetime.now(timezone.utc)
+        self.started = None
+        self.finished = None
+        self.done = 0
+        self.total = None
+        self.result = None
+        self.error = None
+        self._lock = threading.Lock()
+
+    @property
+    def active(self):
+        return self.status in ("queued", "running")
+
+    def update_progress(self, done, total):
+        with self._lock:
+            self.done, self.total = done, total
+
+    def run(self):
+        self.started = time.perf_counter()
+        self.status = "running"
+        try:
+            self.result = self.fn(progress=self.update_progress)
+            self.status = "succeeded"
+            logger.success(f"Job {self.id} ({self.key}) finished: {self.result}")
+        except Exception as e:
+            self.error = str(e)
+            self.status = "failed"
+            logger.error(f"Job {self.id} ({self.key}) failed: {e}")
+        finally:
+            self.finished = time.perf_counter()
+
+    def to_dict(self):
+        with self._lock:
+            done, total = self.done, self.total
+        elapsed = None
+        if self.started is not None:
+            elapsed = (self.finished or time.perf_counter()) - self.started
+        throughput = done / elapsed if elapsed and done else None
+        eta = None
+        if self.status == "running" and throughput and total is not None:
+            eta = max(total - done, 0) / throughput
+        return {
+            "job_id": self.id,
+            "key": self.key,
+            "status": self.status,
+            "submitted_at": self.submitted_at.isoformat(timespec="seconds"),
+            "rows_processed": done,
+            "total_rows": total,
+            "percent": round(100.0 * done / total, 1) if total else None,
+            "elapsed_seconds": round(elapsed, 2) if elapsed is not None else None,
+            "rows_per_second": round(throughput, 1) if throughput else None,
+            "eta_seconds": round(eta, 1) if eta is not None else None,
+            "result": self.result,
+            "error": self.error,
+        }
+
+class JobRunner:
+    """Runs jobs on max_workers background threads and keeps the last JOB_HISTORY of them"""
+
+    def __init__(self, max_workers=1, history=JOB_HISTORY):
+        self._pool = ThreadPoolExecutor(max_workers, thread_name_prefix="job")
+        self._jobs = OrderedDict()
+        self._history = history
+        self._lock = threading.Lock()
+
+    def submit(self, key, fn):
+        """(job, created): the active job with this key if there is one, else a newly queued job"""
+        with self._lock:
+            for job in reversed(self._jobs.values()):
+                if job.key == key and job.active:
+                    return job, False
+            job = Job(key, fn)
+            self._jobs[job.id] = job
+            # Forget the oldest finished jobs beyond the history limit
+            finished = [j.id for j in self._jobs.values() if not j.active]
+            for job_id in itertools.islice(finished, max(len(self._jobs) - self._history, 0)):
+                del self._jobs[job_id]
+        self._pool.submit(job.run)
+        logger.info(f"Queued job {job.id} ({key})")
+        return job, True
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def jobs(self):
+        with self._lock:
+            return list(self._jobs.values())
@@ -0,0 +1,288 @@
+"""
+Versioned schema migrations for the patient tables
+
+Each migration runs once per table, in its own transaction, and is recorded in
+schema_migrations. Steps are idempotent so two processes racing at startup end
+up with the same schema.
+"""
+
+from datetime import datetime, timezone
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from risk.logger import logger
+from risk.preprocess import input_cols
+
+def table_exists(conn, table_name):
+    row = conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {"name": table_name},
+    ).fetchone()
+    return row is not None
+
+def table_columns(conn, table_name):
+    return [row[1] for row in conn.execute(text(f"PRAGMA table_info({table_name})"))]
+
+def _add_columns(conn, table_name, column_defs):
+    existing = set(table_columns(conn, table_name))
+    for column_def in column_defs:
+        column_name = column_def.split()[0]
+        if column_name not in existing:
+            conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {column_def}"))
+            logger.info(f"Added column {column_name} to {table_name}")
+
+PREDICTION_COLUMNS = [
+    "RISK_30D INTEGER",
+    "RISK_60D INTEGER",
+    "RISK_90D INTEGER",
+    "RISK_LABEL TEXT",
+    "TOP_3_FEATURES TEXT",
+    "AI_RECOMMENDATIONS TEXT",
+    "EMAIL TEXT",
+]
+
+def _add_prediction_columns(conn, table_name):
+    _add_columns(conn, table_name, PREDICTION_COLUMNS)
+
+def _index_patient_id(conn, table_name):
+    try:
+        conn.execute(text(f"CREATE UNIQUE INDEX IF NOT EXISTS ux_{table_name}_patient_id "
+                          f"ON {table_name}(DESYNPUF_ID)"))
+    except IntegrityError:
+        # Duplicate ids already in the data: still index lookups, but don't enforce uniqueness
+        logger.warning(f"{table_name} has duplicate DESYNPUF_ID values, creating a non-unique index")
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{table_name}_patient_id "
+                          f"ON {table_name}(DESYNPUF_ID)"))
+
+def _index_risk_ordering(conn, table_name):
+    # ORDER BY RISK_30D DESC with DESYNPUF_ID as tie-breaker, read straight off the index
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{table_name}_risk_30d "
+                      f"ON {table_name}(RISK_30D DESC, DESYNPUF_ID)"))
+
+def _index_risk_label(conn, table_name):
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{table_name}_risk_label "
+                      f"ON {table_name}(RISK_LABEL)"))
+
+# Columns the dashboard can sort by; each gets a (col DESC, DESYNPUF_ID) index so a
+# keyset page is one index seek whichever column is chosen
+SORTABLE_COLUMNS = ("RISK_30D", "RISK_60D", "RISK_90D", "AGE", "TOTAL_CLAIMS_COST")
+
+def _index_sort_columns(conn, table_name):
+    existing = set(table_columns(conn, table_name))
+    for column in SORTABLE_COLUMNS:
+        if column == "RISK_30D" or column not in existing:
+            continue  # RISK_30D is covered by migration 3
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{table_name}_{column.lower()} "
+                          f"ON {table_name}({column} DESC, DESYNPUF_ID)"))
+    # Label filter combined with the default sort
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{table_name}_label_risk_30d "
+                      f"ON {table_name}(RISK_LABEL, RISK_30D DESC, DESYNPUF_ID)"))
+
+def summary_table_name(table_name):
+    return f"{table_name}_risk_summary"
+
+# Per-label running totals kept in the summary table: (count column, sum column, source column)
+SUMMARY_MEASURES = [
+    ("n_30d", "sum_30d", "RISK_30D"),
+    ("n_60d", "sum_60d", "RISK_60D"),
+    ("n_90d", "sum_90d", "RISK_90D"),
+    ("n_age", "sum_age", "AGE"),
+]
+
+def _summary_delta(row, sign, existing):
+    """Column assignments adding (sign "+") or removing ("-") one row's contribution"""
+    parts = ["n = n " + sign + " 1"]
+    for n_col, sum_col, source in SUMMARY_MEASURES:
+        value = f"{row}.{source}" if source in existing else "NULL"
+        parts.append(f"{n_col} = {n_col} {sign} ({value} IS NOT NULL)")
+        parts.append(f"{sum_col} = {sum_col} {sign} COALESCE({value}, 0)")
+    return ", ".join(parts)
+
+def _risk_summary_triggers(conn, table_name):
+    """Summary table with per-label counts and sums, kept current by triggers.
+
+    Every insert, delete and effective update of a risk/label/age value moves
+    that row's contribution between labels, so reading the summary costs one
+    row per label however large the table is. NULL labels are stored as ''.
+    """
+    summary = summary_table_name(table_name)
+    existing = set(table_columns(conn, table_name))
+    measure_cols = ", ".join(f"{n_col} INTEGER NOT NULL DEFAULT 0, {sum_col} NUMERIC NOT NULL DEFAULT 0"
+                             for n_col, sum_col, _ in SUMMARY_MEASURES)
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {summary} ("
+                      f"RISK_LABEL TEXT PRIMARY KEY, n INTEGER NOT NULL DEFAULT 0, {measure_cols})"))
+
+    # Backfill from the current contents
+    aggregates = ", ".join(
+        f"COUNT({source}), COALESCE(SUM({source}), 0)" if source in existing else "0, 0"
+        for _, _, source in SUMMARY_MEASURES)
+    names = ", ".join(f"{n_col}, {sum_col}" for n_col, sum_col, _ in SUMMARY_MEASURES)
+    conn.execute(text(f"DELETE FROM {summary}"))
+    conn.execute(text(f"INSERT INTO {summary} (RISK_LABEL, n, {names}) "
+                      f"SELECT COALESCE(RISK_LABEL, ''), COUNT(*), {aggregates} FROM {table_name} "
+                      f"GROUP BY COALESCE(RISK_LABEL, '')"))
+
+    def ensure_label(row):
+        return (f"INSERT INTO {summary} (RISK_LABEL) VALUES (COALESCE({row}.RISK_LABEL, '')) "
+                f"ON CONFLICT(RISK_LABEL) DO NOTHING;")
+
+    def apply(row, sign):
+        return (f"UPDATE {summary} SET {_summary_delta(row, sign, existing)} "
+                f"WHERE RISK_LABEL = COALESCE({row}.RISK_LABEL, '');")
+
+    watched = ["RISK_LABEL"] + [source for _, _, source in SUMMARY_MEASURES if source in existing]
+    changed = " OR ".join(f"OLD.{col} IS NOT NEW.{col}" for col in watched)
+    for name in ("insert", "delete", "update"):
+        conn.execute(text(f"DROP TRIGGER IF EXISTS trg_{table_name}_summary_{name}"))
+    conn.execute(text(f"CREATE TRIGGER trg_{table_name}_summary_insert AFTER INSERT ON {table_name} "
+                      f"BEGIN {ensure_label('NEW')} {apply('NEW', '+')} END"))
+    conn.execute(text(f"CREATE TRIGGER trg_{table_name}_summary_delete AFTER DELETE ON {table_name} "
+                      f"BEGIN {apply('OLD', '-')} END"))
+    conn.execute(text(f"CREATE TRIGGER trg_{table_name}_summary_update "
+                      f"AFTER UPDATE OF {', '.join(watched)} ON {table_name} WHEN {changed} "
+                      f"BEGIN {apply('OLD', '-')} {ensure_label('NEW')} {apply('NEW', '+')} END"))
+
+def _scoring_checkpoints(conn, table_name):
+    """Where the last chunked scoring run of each (table, row filter) got to"""
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS scoring_checkpoints (
+            table_name TEXT NOT NULL,
+            scope TEXT NOT NULL,
+            last_id TEXT NOT NULL,
+            model_version TEXT,
+            status TEXT NOT NULL,
+            rows_done INTEGER NOT NULL,
+            updated_at TEXT NOT NULL,
+            PRIMARY KEY (table_name, scope)
+        )
+    """))
+    # A recreated table starts with no progress
+    conn.execute(text("DELETE FROM scoring_checkpoints WHERE table_name = :table"), {"table": table_name})
+
+# Fingerprint of the inputs a row was scored from and the model that scored it
+SCORING_STAMP_COLUMNS = [
+    "FEATURE_HASH TEXT",
+    "MODEL_VERSION TEXT",
+]
+
+def _scoring_stamps(conn, table_name):
+    """Stamp columns, cleared by a trigger whenever a row's model inputs change.
+
+    A row whose FEATURE_HASH is NULL (never stamped, or edited since) or whose
+    MODEL_VERSION is not the current model's needs rescoring; everything else
+    would get the same prediction again.
+    """
+    _add_columns(conn, table_name, SCORING_STAMP_COLUMNS)
+    existing = set(table_columns(conn, table_name))
+    watched = [col for col in input_cols if col in existing]
+    conn.execute(text(f"DROP TRIGGER IF EXISTS trg_{table_name}_feature_change"))
+    if not watched:
+        return
+    changed = " OR ".join(f"OLD.{col} IS NOT NEW.{col}" for col in watched)
+    conn.execute(text(f"CREATE TRIGGER trg_{table_name}_feature_change "
+                      f"AFTER UPDATE OF {', '.join(watched)} ON {table_name} WHEN {changed} "
+                      f"BEGIN UPDATE {table_name} SET FEATURE_HASH = NULL WHERE rowid = NEW.rowid; END"))
+
+# Sort columns that also have a (RISK_LABEL, col DESC, DESYNPUF_ID) index (migration 5).
+# Only the default sort gets one: every index is one more to maintain on each
+# prediction write-back, so other filters are checked while walking the sort index.
+LABEL_SORT_COLUMNS = ("RISK_30D",)
+
+def _drop_label_index(conn, table_name):
+    # (RISK_LABEL, RISK_30D DESC, DESYNPUF_ID) serves every lookup by label on its own
+    conn.execute(text(f"DROP INDEX IF EXISTS ix_{table_name}_risk_label"))
+
+def _checkpoint_rowids(conn, table_name):
+    """Checkpoints record the (DESYNPUF_ID, rowid) position of a chunked scan; NULL for
+    ones written before this column, which resume after every row with their id"""
+    _add_columns(conn, "scoring_checkpoints", ["last_rowid INTEGER"])
+
+def ensure_data_version(conn):
+    """Single-row counter of writes to the patient tables, which response caches key on"""
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS data_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+    """))
+    conn.execute(text("INSERT OR IGNORE INTO data_version (id, version, updated_at) VALUES (1, 0, :now)"),
+                 {"now": datetime.now(timezone.utc).isoformat(timespec="seconds")})
+
+def _data_version_triggers(conn, table_name):
+    """Triggers that bump data_version on every insert, update and delete.
+
+    Scripts that write through sqlite3 directly move the version as well, so
+    cached responses and patient rows never outlive a write. The triggers are
+    per row: a bulk write advances the version by its row count.
+    """
+    ensure_data_version(conn)
+    bump = ("UPDATE data_version SET version = version + 1, "
+            "updated_at = strftime('%Y-%m-%dT%H:%M:%S+00:00', 'now') WHERE id = 1;")
+    for name in ("insert", "update", "delete"):
+        conn.execute(text(f"DROP TRIGGER IF EXISTS trg_{table_name}_data_version_{name}"))
+        conn.execute(text(f"CREATE TRIGGER trg_{table_name}_data_version_{name} "
+                          f"AFTER {name.upper()} ON {table_name} BEGIN {bump} END"))
+
+# (version, description, step); append new migrations, never reorder or edit applied ones
+MIGRATIONS = [
+    (1, "prediction and email columns", _add_prediction_columns),
+    (2, "unique index on DESYNPUF_ID", _index_patient_id),
+    (3, "index for RISK_30D DESC ordering", _index_risk_ordering),
+    (4, "index on RISK_LABEL", _index_risk_label),
+    (5, "indexes for keyset pages on each sort column", _index_sort_columns),
+    (6, "per-label risk summary maintained by triggers", _risk_summary_triggers),
+    (7, "scoring checkpoints", _scoring_checkpoints),
+    (8, "feature fingerprint and model version stamps", _scoring_stamps),
+    (9, "drop the RISK_LABEL index covered by the label/RISK_30D index", _drop_label_index),
+    (10, "rowid in scoring checkpoints", _checkpoint_rowids),
+    (11, "data version bumped by triggers", _data_version_triggers),
+]
+
+def _ensure_migrations_table(conn):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            table_name TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            applied_at TEXT NOT NULL,
+            PRIMARY KEY (table_name, version)
+        )
+    """))
+
+def applied_versions(conn, table_name):
+    _ensure_migrations_table(conn)
+    rows = conn.execute(
+        text("SELECT version FROM schema_migrations WHERE table_name = :table"),
+        {"table": table_name},
+    )
+    return {row[0] for row in rows}
+
+def apply_migrations(engine, table_name):
+    """Apply pending migrations to table_name; returns the versions applied this call"""
+    with engine.begin() as conn:
+        if not table_exists(conn, table_name):
+            logger.warning(f"Table {table_name} does not exist yet, skipping migrations")
+            return []
+        done = applied_versions(conn, table_name)
+
+    applied = []
+    for version, name, step in MIGRATIONS:
+        if version in done:
+            continue
+        with engine.begin() as conn:
+            step(conn, table_name)
+            conn.execute(
+                text("INSERT OR IGNORE INTO schema_migrations (table_name, version, name, applied_at) "
+                     "VALUES (:table, :version, :name, :applied_at)"),
+                {"table": table_name, "version": version, "name": name,
+                 "applied_at": datetime.now().isoformat(timespec="seconds")},
+            )
+        logger.info(f"Applied migration {version} ({name}) to {table_name}")
+        applied.append(version)
+    return applied
+
+def reset_migrations(engine, table_name):
+    """Forget migrations recorded for a table that was dropped and recreated"""
+    with engine.begin() as conn:
+        _ensure_migrations_table(conn)
+        conn.execute(text("DELETE FROM schema_migrations WHERE table_name = :table"), {"table": table_name})
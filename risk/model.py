@@ -83,6 +83,12 @@ def load_model(path="models/risk_model.pkl"):
     with open(path, "rb") as f:
         return pickle.load(f)
 """
+import copy
+import hashlib
+import json
+import os
+import sqlite3
+import threading
 import numpy as np
 import pandas as pd
 import shap
@@ -91,10 +97,30 @@ from sklearn.pipeline import Pipeline
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.preprocessing import StandardScaler
 from risk.preprocess import preprocess_features, feature_cols, target_cols
+from risk.cache import LRUCache
+from risk.logger import logger
+
+MODEL_PATH = "models/risk_model.pkl"
+
+# "separate": one scaler+forest pipeline per horizon, pickled as {target_col: pipeline}
+# "multioutput": one pipeline whose forest predicts all horizons in a single pass,
+#                pickled as {"engine": "multioutput", "regressor": pipeline}
+ENGINES = ("separate", "multioutput")
 
 regressors = {}
 
-def train_models(df: pd.DataFrame):
+def _build_pipeline():
+    return Pipeline([
+        ("scaler", StandardScaler()),
+        ("rf", RandomForestRegressor(
+            n_estimators=50, max_depth=4, min_samples_leaf=50,
+            min_samples_split=20, max_features="log2", random_state=42
+        ))
+    ])
+
+def train_models(df: pd.DataFrame, engine="separate"):
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine {engine!r}, expected one of {ENGINES}")
     from sklearn.model_selection import train_test_split
     from sklearn.metrics import mean_absolute_error, r2_score
 
@@ -108,14 +134,18 @@ def train_models(df: pd.DataFrame):
 
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.3, random_state=42)
 
+    if engine == "multioutput":
+        reg = _build_pipeline()
+        reg.fit(X_train, y_train)
+        preds = reg.predict(X_test)
+        for i, col in enumerate(target_cols):
+            mae = mean_absolute_error(y_test[:, i], preds[:, i])
+            r2 = r2_score(y_test[:, i], preds[:, i])
+            print(f"{col} → MAE={mae:.3f}, R²={r2:.3f}")
+        return {"engine": "multioutput", "regressor": reg}
+
     for i, col in enumerate(target_cols):
-        reg = Pipeline([
-            ("scaler", StandardScaler()),
-            ("rf", RandomForestRegressor(
-                n_estimators=50, max_depth=4, min_samples_leaf=50,
-                min_samples_split=20, max_features="log2", random_state=42
-            ))
-        ])
+        reg = _build_pipeline()
         reg.fit(X_train, y_train[:, i])
         regressors[col] = reg
 
@@ -126,14 +156,330 @@ def train_models(df: pd.DataFrame):
 
     return regressors
 
-def save_model(regressors, path="models/risk_model.pkl"):
-    with open(path, "wb") as f:
+def model_inputs(X):
+    """Feature matrix rounded to float32 values, the precision trees compare features at.
+
+    Rounding once up front gives the scaled and the folded (export_model) forests
+    the same numbers, so they agree on every row, split boundaries included.
+    """
+    return np.asarray(X, dtype=np.float32).astype(np.float64)
+
+def _raw_thresholds(threshold, mean, scale):
+    """Raw-unit split thresholds equivalent to scaled ones, one per split.
+
+    Trees compare float32(feature) <= threshold, so the scaled split sends x left
+    when float32((x - mean) / scale) <= t. That is monotone in x, so the left
+    branch is every float32 x up to some largest value; return that value, found
+    by stepping one float32 ulp at a time from t * scale + mean. On float32
+    inputs the folded split then agrees with the scaled one even on the boundary.
+    """
+    def scaled(x):
+        return ((x.astype(np.float64) - mean) / scale).astype(np.float32)
+
+    x = (threshold * scale + mean).astype(np.float32)
+    while True:
+        right = scaled(x) > threshold
+        if not right.any():
+            break
+        x[right] = np.nextafter(x[right], np.float32(-np.inf))
+    while True:
+        up = np.nextafter(x, np.float32(np.inf))
+        left = scaled(up) <= threshold
+        if not left.any():
+            break
+        x[left] = up[left]
+    return x.astype(np.float64)
+
+def _fold_pipeline(pipeline):
+    """Copy of a scaler+forest pipeline with the scaling folded into the split thresholds"""
+    scaler = pipeline.named_steps["scaler"]
+    if scaler == "passthrough":
+        return pipeline
+    rf = copy.deepcopy(pipeline.named_steps["rf"])
+    n_features = rf.n_features_in_
+    mean = scaler.mean_ if scaler.mean_ is not None else np.zeros(n_features)
+    scale = scaler.scale_ if scaler.scale_ is not None else np.ones(n_features)
+
+    # A split "(x - mean) / scale <= t" becomes "x <= t * scale + mean" (scale > 0),
+    # adjusted to the float32 grid the trees compare on
+    for tree in rf.estimators_:
+        feature = tree.tree_.feature
+        threshold = tree.tree_.threshold  # writable view into the tree's node array
+        internal = feature >= 0
+        threshold[internal] = _raw_thresholds(threshold[internal], mean[feature[internal]],
+                                              scale[feature[internal]])
+
+    return Pipeline([("scaler", "passthrough"), ("rf", rf)])
+
+def export_model(regressors):
+    """Model bundle whose forests split on raw feature values, so inference skips StandardScaler"""
+    if model_engine(regressors) == "multioutput":
+        return {"engine": "multioutput", "regressor": _fold_pipeline(regressors["regressor"])}
+    return {col: _fold_pipeline(regressors[col]) for col in target_cols}
+
+def check_export_equivalence(regressors, exported, X, atol=1e-6):
+    """Raise ValueError unless the exported model reproduces the original predictions and
+    SHAP top-3 rankings on X; returns the largest prediction difference"""
+    X = model_inputs(X)
+    max_diff = float(np.max(np.abs(predict_risks(regressors, X) - predict_risks(exported, X))))
+    if max_diff > atol:
+        raise ValueError(f"Exported model predictions differ by up to {max_diff:.3g}")
+
+    top_before = top_k_features(explain_risk(regressors, X, "RISK_30D"))[0]
+    top_after = top_k_features(explain_risk(exported, X, "RISK_30D"))[0]
+    mismatches = int(np.sum(top_before != top_after))
+    if mismatches:
+        raise ValueError(f"Exported model changes TOP_3_FEATURES for {mismatches} of {len(X)} rows")
+    return max_diff
+
+class CompiledForest:
+    """Every horizon's trees flattened into complete-binary-tree NumPy arrays.
+
+    Node i has children 2i+1 / 2i+2, so traversal is pure index arithmetic and a
+    batch of rows walks all trees of all horizons together. Leaves above the
+    maximum depth are padded with always-go-left nodes down to the bottom level.
+    Scaling is folded into the thresholds (see export_model), so raw features go in.
+    """
+
+    MAX_DEPTH = 12
+
+    def __init__(self, regressors):
+        # (tree, value array column -> output column, weight)
+        trees = []
+        if model_engine(regressors) == "multioutput":
+            rf = _fold_pipeline(regressors["regressor"]).named_steps["rf"]
+            outputs = list(range(len(target_cols)))
+            for est in rf.estimators_:
+                trees.append((est.tree_, outputs, 1.0 / len(rf.estimators_)))
+        else:
+            for i, col in enumerate(target_cols):
+                rf = _fold_pipeline(regressors[col]).named_steps["rf"]
+                for est in rf.estimators_:
+                    trees.append((est.tree_, [i], 1.0 / len(rf.estimators_)))
+
+        self.depth = max(tree.max_depth for tree, _, _ in trees)
+        if self.depth > self.MAX_DEPTH:
+            raise ValueError(f"Trees of depth {self.depth} are too deep to compile (max {self.MAX_DEPTH})")
+
+        self.n_trees = len(trees)
+        self.n_internal = 2 ** self.depth - 1
+        self.n_features = None
+        feature = np.zeros((self.n_trees, self.n_internal), dtype=np.intp)
+        threshold = np.full((self.n_trees, self.n_internal), np.inf)
+        # Each tree only contributes to the horizons it predicts; other columns stay 0
+        self.leaf_value = np.zeros((self.n_trees, 2 ** self.depth, len(target_cols)))
+
+        for t, (tree, outputs, weight) in enumerate(trees):
+            self._fill(t, tree, outputs, weight, feature, threshold, node=0, slot=0, level=0)
+
+        # Flat copies so traversal can use cheap 1-D np.take gathers
+        self.feature = feature.ravel()
+        self.threshold = threshold.ravel()
+
+    def _fill(self, t, tree, outputs, weight, feature, threshold, node, slot, level):
+        if level == self.depth:
+            leaf = slot - self.n_internal
+            self.leaf_value[t, leaf, outputs] = tree.value[node, :len(outputs), 0] * weight
+            return
+        if tree.children_left[node] == -1:
+            # Leaf above the bottom level: threshold stays +inf, so every row keeps going left
+            self._fill(t, tree, outputs, weight, feature, threshold, node, 2 * slot + 1, level + 1)
+            return
+        feature[t, slot] = tree.feature[node]
+        threshold[t, slot] = tree.threshold[node]
+        self._fill(t, tree, outputs, weight, feature, threshold, tree.children_left[node], 2 * slot + 1, level + 1)
+        self._fill(t, tree, outputs, weight, feature, threshold, tree.children_right[node], 2 * slot + 2, level + 1)
+
+    def predict(self, X, block_size=512):
+        """Raw risk predictions for every horizon, shape (n_rows, len(target_cols))"""
+        # sklearn compares float32 features against float64 thresholds; do the same
+        X = model_inputs(X)
+        n_rows, n_features = X.shape
+        out = np.empty((n_rows, self.leaf_value.shape[2]))
+        tree_offset = (np.arange(self.n_trees) * self.n_internal)[:, None]
+        leaf_offset = (np.arange(self.n_trees) * 2 ** self.depth)[:, None]
+        leaf_values = self.leaf_value.reshape(-1, self.leaf_value.shape[2])
+
+        for start in range(0, n_rows, block_size):
+            block = X[start:start + block_size]
+            flat = block.ravel()
+            row_offset = (np.arange(len(block)) * n_features)[None, :]
+            slot = np.zeros((self.n_trees, len(block)), dtype=np.intp)
+            for _ in range(self.depth):
+                node = tree_offset + slot
+                values = flat.take(row_offset + self.feature.take(node))
+                slot = 2 * slot + 1 + (values > self.threshold.take(node))
+            leaves = leaf_offset + slot - self.n_internal
+            out[start:start + len(block)] = leaf_values.take(leaves.ravel(), axis=0) \
+                .reshape(self.n_trees, len(block), -1).sum(axis=0)
+        return out
+
+def get_compiled(regressors):
+    if isinstance(regressors, LoadedModel):
+        return regressors.compiled()
+    return CompiledForest(regressors)
+
+def save_model(regressors, path=MODEL_PATH):
+    # Write to a temp file and rename so a running app never reads a half-written pickle
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
         pickle.dump(regressors, f)
+    os.replace(tmp_path, path)
 
-def load_model(path="models/risk_model.pkl"):
+def load_model(path=MODEL_PATH):
     with open(path, "rb") as f:
         return pickle.load(f)
 
+class LoadedModel(dict):
+    """Regressors dict plus the per-model state that is expensive to rebuild per call"""
+
+    def __init__(self, regressors, version=None, path=None):
+        super().__init__(regressors)
+        self.version = version
+        self.path = path
+        self._explainers = {}
+        self._compiled = None
+        self._lock = threading.Lock()
+
+    def compiled(self):
+        """CompiledForest for this model, built on first use and then reused"""
+        if self._compiled is None:
+            with self._lock:
+                if self._compiled is None:
+                    self._compiled = CompiledForest(self)
+        return self._compiled
+
+    def explainer(self, col="RISK_30D"):
+        """SHAP TreeExplainer for one horizon, built on first use and then reused"""
+        # Keyed by pipeline so the horizons of a multi-output model share one explainer
+        pipeline, _ = horizon_pipeline(self, col)
+        key = id(pipeline)
+        explainer = self._explainers.get(key)
+        if explainer is None:
+            with self._lock:
+                explainer = self._explainers.get(key)
+                if explainer is None:
+                    explainer = shap.TreeExplainer(pipeline.named_steps["rf"])
+                    self._explainers[key] = explainer
+        return explainer
+
+def versioned_model(regressors):
+    """regressors as a model with a version to stamp its predictions with.
+
+    Registry models already carry the hash of their pickle file. Any other model
+    gets the hash of its pickled regressors, so rows it scores are stamped with
+    a version that later stale-mode runs of the same model recognise.
+    """
+    if getattr(regressors, "version", None) is not None:
+        return regressors
+    version = hashlib.sha256(pickle.dumps(dict(regressors))).hexdigest()[:16]
+    return LoadedModel(regressors, version=version)
+
+def model_engine(regressors):
+    return regressors.get("engine", "separate")
+
+def horizon_pipeline(regressors, col):
+    """Pipeline that predicts `col`, and the output index to select (None for single-output)"""
+    if model_engine(regressors) == "multioutput":
+        return regressors["regressor"], target_cols.index(col)
+    return regressors[col], None
+
+def get_explainer(regressors, col="RISK_30D"):
+    if isinstance(regressors, LoadedModel):
+        return regressors.explainer(col)
+    # Plain regressors dict (e.g. straight from load_model): nowhere to keep it
+    pipeline, _ = horizon_pipeline(regressors, col)
+    return shap.TreeExplainer(pipeline.named_steps["rf"])
+
+def predict_risks(regressors, X):
+    """Raw risk predictions for every horizon, shape (n_rows, len(target_cols))"""
+    if model_engine(regressors) == "multioutput":
+        return regressors["regressor"].predict(X).reshape(len(X), len(target_cols))
+    return np.column_stack([regressors[col].predict(X) for col in target_cols])
+
+def _scale(pipeline, X):
+    scaler = pipeline.named_steps.get("scaler")
+    if scaler is None or scaler == "passthrough":
+        # Exported model: thresholds already in raw feature units
+        return X
+    return scaler.transform(X)
+
+def explain_risk(regressors, X, col="RISK_30D"):
+    """SHAP values of one horizon's prediction, shape (n_rows, n_features)"""
+    pipeline, output = horizon_pipeline(regressors, col)
+    X_transformed = _scale(pipeline, X)
+    shap_values = get_explainer(regressors, col).shap_values(X_transformed)
+    if output is not None:
+        # Multi-output forests: a list per output in older shap, a trailing axis in newer
+        shap_values = shap_values[output] if isinstance(shap_values, list) else shap_values[..., output]
+    return shap_values
+
+class ModelRegistry:
+    """Process-wide cache of a pickled model, reloaded when the file on disk changes"""
+
+    def __init__(self, path=MODEL_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        # (file stamp, content hash, model) swapped as a single reference so readers
+        # always see a consistent triple; callers keep whatever model they were handed
+        self._current = (None, None, None)
+
+    def _file_stamp(self):
+        st = os.stat(self.path)
+        return (st.st_mtime_ns, st.st_size)
+
+    @property
+    def version(self):
+        return self._current[1]
+
+    def get(self):
+        """Return the current model, reloading it first if the pickle was rewritten"""
+        stamp = self._file_stamp()
+        current_stamp, _, model = self._current
+        if model is not None and stamp == current_stamp:
+            return model
+
+        with self._lock:
+            current_stamp, version, model = self._current
+            if model is not None and stamp == current_stamp:
+                return model
+
+            with open(self.path, "rb") as f:
+                payload = f.read()
+            new_version = hashlib.sha256(payload).hexdigest()[:16]
+
+            if model is not None and new_version == version:
+                # File was touched but the content is unchanged
+                self._current = (stamp, version, model)
+                return model
+
+            try:
+                new_model = LoadedModel(pickle.loads(payload), version=new_version, path=self.path)
+                # Build the explainer up front so the first request doesn't pay for it
+                new_model.explainer("RISK_30D")
+            except Exception as e:
+                if model is None:
+                    raise
+                logger.warning(f"Failed to reload model from {self.path}, keeping version {version}: {e}")
+                return model
+
+            self._current = (stamp, new_version, new_model)
+            logger.info(f"Loaded model {new_version} from {self.path}")
+            return new_model
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+def get_registry(path=MODEL_PATH):
+    with _registries_lock:
+        if path not in _registries:
+            _registries[path] = ModelRegistry(path)
+        return _registries[path]
+
+def get_model(path=MODEL_PATH):
+    """Get the cached model for this worker, hot-reloading it after train.py saves a new one"""
+    return get_registry(path).get()
+
 def assign_label(score):
     if score >= 85:
         return "Very High Risk"
@@ -146,54 +492,251 @@ def assign_label(score):
     else:
         return "Very Low Risk"
 
-def predict_batch(df_in, regressors):
+def top_k_features(shap_values, k=3, names=feature_cols):
+    """Top-k features by |SHAP| for every row at once.
+
+    Returns the comma-joined feature names (same strings as TOP_3_FEATURES),
+    the column indices and the signed contributions, each with one row per patient.
+    Ties keep feature_cols order, like the stable sort this replaces.
+    """
+    shap_values = np.asarray(shap_values)
+    k = min(k, shap_values.shape[1])
+    idx = np.argsort(-np.abs(shap_values), axis=1, kind="stable")[:, :k]
+    contribs = np.take_along_axis(shap_values, idx, axis=1)
+
+    names = np.asarray(names, dtype=object)
+    labels = names[idx[:, 0]]
+    for j in range(1, k):
+        labels = labels + ", " + names[idx[:, j]]
+    return labels, idx, contribs
+
+def feature_fingerprints(X):
+    """16-hex-digit hash of each row of the model input matrix.
+
+    Rows with the same feature values get the same fingerprint, so a stored
+    fingerprint tells whether a patient's inputs changed since it was scored.
+    """
+    hashes = pd.util.hash_pandas_object(pd.DataFrame(np.asarray(X, dtype=float)), index=False)
+    return [f"{h:016x}" for h in hashes.tolist()]
+
+PREDICTION_CACHE_SIZE = int(os.environ.get("PREDICTION_CACHE_SIZE", 50000))
+# SQLite file shared by processes and restarts; unset keeps the cache in memory only
+PREDICTION_CACHE_DB = os.environ.get("PREDICTION_CACHE_DB")
+
+class PredictionCache:
+    """Model outputs by (model version, feature fingerprint).
+
+    An entry holds what the forests and SHAP produce for one feature vector:
+    the raw risk per horizon and the top-3 SHAP feature indices and
+    contributions. Lookups go to an in-memory LRU first, then to the optional
+    SQLite file, whose hits are promoted into memory.
+    """
+
+    def __init__(self, maxsize=PREDICTION_CACHE_SIZE, path=None):
+        self.memory = LRUCache(maxsize)
+        self.path = path
+        self._conn = None
+        self._disk_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.rows = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.last_batch = None
+
+    def _disk(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS prediction_cache (
+                    model_version TEXT NOT NULL,
+                    feature_hash TEXT NOT NULL,
+                    risks TEXT NOT NULL,
+                    top_idx TEXT NOT NULL,
+                    top_contribs TEXT NOT NULL,
+                    PRIMARY KEY (model_version, feature_hash)
+                )
+            """)
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get_many(self, version, fingerprints):
+        """{fingerprint: (risks, top_idx, top_contribs)} for the distinct fingerprints already cached"""
+        found, missing = {}, []
+        for fp in set(fingerprints):
+            entry = self.memory.get((version, fp))
+            if entry is None:
+                missing.append(fp)
+            else:
+                found[fp] = entry
+        if missing and self.path:
+            try:
+                from_disk = self._read_disk(version, missing)
+            except sqlite3.Error as e:
+                logger.warning(f"Prediction cache file {self.path} unreadable, skipping it: {e}")
+                from_disk = {}
+            for fp, entry in from_disk.items():
+                self.memory.put((version, fp), entry)
+            found.update(from_disk)
+            with self._stats_lock:
+                self.disk_hits += len(from_disk)
+        return found
+
+    def _read_disk(self, version, fingerprints, batch=500):
+        entries = {}
+        with self._disk_lock:
+            conn = self._disk()
+            for start in range(0, len(fingerprints), batch):
+                part = fingerprints[start:start + batch]
+                rows = conn.execute(
+                    f"SELECT feature_hash, risks, top_idx, top_contribs FROM prediction_cache "
+                    f"WHERE model_version = ? AND feature_hash IN ({', '.join('?' * len(part))})",
+                    [version, *part],
+                )
+                for fp, risks, top_idx, top_contribs in rows:
+                    entries[fp] = (np.array(json.loads(risks), dtype=float),
+                                   np.array(json.loads(top_idx), dtype=int),
+                                   np.array(json.loads(top_contribs), dtype=float))
+        return entries
+
+    def put_many(self, version, entries):
+        for fp, entry in entries.items():
+            self.memory.put((version, fp), entry)
+        if not entries or not self.path:
+            return
+        rows = [(version, fp, json.dumps(risks.tolist()), json.dumps(top_idx.tolist()), json.dumps(top_contribs.tolist()))
+                for fp, (risks, top_idx, top_contribs) in entries.items()]
+        try:
+            with self._disk_lock:
+                conn = self._disk()
+                with conn:
+                    conn.executemany("INSERT OR REPLACE INTO prediction_cache VALUES (?, ?, ?, ?, ?)", rows)
+        except sqlite3.Error as e:
+            logger.warning(f"Could not write {len(rows)} entries to prediction cache file {self.path}: {e}")
+
+    def record_batch(self, rows, hits, computed):
+        """Count one predict_batch call: rows in it, rows served from cache, distinct vectors computed"""
+        with self._stats_lock:
+            self.batches += 1
+            self.rows += rows
+            self.hits += hits
+            self.last_batch = {"rows": rows, "hits": hits, "computed": computed,
+                               "hit_rate": hits / rows if rows else 0.0}
+
+    def clear(self):
+        self.memory.clear()
+
+    def __getstate__(self):
+        # For worker processes: same size and disk file, an empty memory tier of their own
+        return {"maxsize": self.memory.maxsize, "path": self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state["maxsize"], state["path"])
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "batches": self.batches,
+                "rows": self.rows,
+                "hits": self.hits,
+                "hit_rate": self.hits / self.rows if self.rows else 0.0,
+                "disk_hits": self.disk_hits,
+                "last_batch": self.last_batch,
+                "memory": self.memory.stats(),
+                "disk_path": self.path,
+            }
+
+prediction_cache = PredictionCache(path=PREDICTION_CACHE_DB)
+
+def prediction_cache_stats():
+    return prediction_cache.stats()
+
+def _model_outputs(regressors, X, compiled=False):
+    """Raw risks, top-3 SHAP indices and contributions for each row of X"""
+    if compiled:
+        risks = get_compiled(regressors).predict(X)
+    else:
+        risks = predict_risks(regressors, X)
+    shap_values = explain_risk(regressors, X, "RISK_30D")
+    _, top_idx, top_contribs = top_k_features(shap_values, k=3)
+    return risks, top_idx, top_contribs
+
+def predict_batch(df_in, regressors, with_contributions=False, compiled=False, cache=prediction_cache):
+    """Predict, explain and recommend for every row of df_in.
+
+    With a cache and a versioned model, forests and SHAP only run for feature
+    vectors not already cached for that model version, once per distinct vector;
+    labels and recommendations are always recomputed. Pass cache=None to skip it.
+    """
     df_proc = preprocess_features(df_in.copy())
     preds = pd.DataFrame({"DESYNPUF_ID": df_proc["DESYNPUF_ID"]})
 
     # Convert feature columns to numpy array to avoid column name issues
     X = df_proc[feature_cols].values
+    fingerprints = feature_fingerprints(X)
+    X = model_inputs(X)
+    version = getattr(regressors, "version", None)
+    if version is None:
+        cache = None  # nothing to tie the entries to a model
 
-    for col in target_cols:
-        p = regressors[col].predict(X)
-        preds[col] = np.clip(np.round(p), 0, 100).astype(int)
+    known = cache.get_many(version, fingerprints) if cache is not None else {}
+    # First row of each distinct feature vector that still has to be computed
+    to_compute = {}
+    for i, fp in enumerate(fingerprints):
+        if fp not in known and fp not in to_compute:
+            to_compute[fp] = i
+    if to_compute:
+        rows = list(to_compute.values())
+        risks, top_idx, top_contribs = _model_outputs(regressors, X[rows], compiled)
+        # Copies, so cached entries don't keep the whole batch's arrays alive
+        computed = {fp: (risks[j].copy(), top_idx[j].copy(), top_contribs[j].copy())
+                    for j, fp in enumerate(to_compute)}
+        if cache is not None:
+            cache.put_many(version, computed)
+        known.update(computed)
 
-    # For SHAP analysis, we need to use the feature names
-    model_30d = regressors["RISK_30D"].named_steps["rf"]
-    X_transformed = regressors["RISK_30D"].named_steps["scaler"].transform(X)
-    explainer = shap.TreeExplainer(model_30d)
-    shap_values = explainer.shap_values(X_transformed)
+    if cache is not None:
+        hits = sum(fp not in to_compute for fp in fingerprints)
+        cache.record_batch(len(fingerprints), hits, len(to_compute))
+        log = logger.info if len(fingerprints) > 1 else logger.debug
+        log(f"Prediction cache: {hits}/{len(fingerprints)} rows hit, {len(to_compute)} distinct vectors computed")
 
-    top_features = []
-    for i in range(len(df_proc)):
-        contribs = dict(zip(feature_cols, shap_values[i]))
-        sorted_feats = sorted(contribs.items(), key=lambda x: abs(x[1]), reverse=True)[:3]
-        formatted = ", ".join([f for f, _ in sorted_feats])
-        top_features.append(formatted)
+    # Spread the per-vector outputs back over the rows
+    distinct = list(known)
+    position = {fp: j for j, fp in enumerate(distinct)}
+    rows = [position[fp] for fp in fingerprints]
+    k = min(3, len(feature_cols))
+    risks = np.array([known[fp][0] for fp in distinct], dtype=float).reshape(len(distinct), len(target_cols))[rows]
+    top_idx = np.array([known[fp][1] for fp in distinct], dtype=int).reshape(len(distinct), k)[rows]
+    top_contribs = np.array([known[fp][2] for fp in distinct], dtype=float).reshape(len(distinct), k)[rows]
+
+    for i, col in enumerate(target_cols):
+        preds[col] = np.clip(np.round(risks[:, i]), 0, 100).astype(int)
+
+    names = np.asarray(feature_cols, dtype=object)[top_idx]
+    top_features = names[:, 0]
+    for j in range(1, k):
+        top_features = top_features + ", " + names[:, j]
 
     preds["RISK_LABEL"] = preds["RISK_30D"].apply(assign_label)
     preds["TOP_3_FEATURES"] = top_features
+    # What was scored and by which model, so rescoring can skip unchanged rows
+    preds["FEATURE_HASH"] = fingerprints
+    preds["MODEL_VERSION"] = version
+
+    if with_contributions:
+        preds["TOP_3_CONTRIBUTIONS"] = [
+            [{"feature": f, "contribution": float(v)} for f, v in zip(row_names, row_vals)]
+            for row_names, row_vals in zip(names, top_contribs)
+        ]
 
     # Add AI recommendations
-    from risk.recommendations import get_ai_recommendations
-    
-    ai_recommendations = []
-    for i, row in preds.iterrows():
-        # Create patient data dictionary for recommendations
-        patient_data = {
-            'RISK_30D': row['RISK_30D'],
-            'RISK_60D': row['RISK_60D'],
-            'RISK_90D': row['RISK_90D']
-        }
-        
-        # Add original patient data if available
-        if i < len(df_proc):
-            for col in df_proc.columns:
-                if col not in patient_data:
-                    patient_data[col] = df_proc.iloc[i][col]
-        
-        recommendations = get_ai_recommendations(patient_data, row['TOP_3_FEATURES'])
-        ai_recommendations.append(recommendations)
-    
-    preds["AI_RECOMMENDATIONS"] = ai_recommendations
+    from risk.recommendations import get_ai_recommendations_batch
+
+    preds["AI_RECOMMENDATIONS"] = get_ai_recommendations_batch(
+        df_proc, preds["TOP_3_FEATURES"].to_numpy(), preds["RISK_30D"].to_numpy()
+    )
 
     return preds
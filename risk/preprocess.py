@@ -35,6 +35,10 @@ feature_cols = [
     "CLAIMS_FLAG", "COMOR_COUNT"
 ] + chronic_cols + ["BP_S", "GLUCOSE", "HbA1c","CHOLESTEROL"]
 
+# Raw columns the model features are computed from; a change to any of them
+# changes the feature fingerprint
+input_cols = [c for c in feature_cols if c not in ("CLAIMS_FLAG", "COMOR_COUNT")]
+
 # Targets
 target_cols = ["RISK_30D", "RISK_60D", "RISK_90D"]
 
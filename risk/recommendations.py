@@ -5,12 +5,27 @@ Analyzes patient risk factors and suggests personalized preventive care actions
 """
 
 import re
-from typing import List, Dict
+from collections.abc import Mapping
+from types import MappingProxyType
+from typing import List, Dict, Sequence
+import numpy as np
+import pandas as pd
+from risk.cache import LRUCache
+
+# Lower bounds of the RISK_30D bands that select the general recommendations
+RISK_30D_BANDS = (80, 60, 40)
 
 class InterventionRecommender:
     """AI-driven intervention recommendation system"""
     
-    def __init__(self):
+    def __init__(self, cache_size: int = 4096):
+        # Recommendations depend only on (top features, their risk levels, RISK_30D band),
+        # so results are memoized on that tuple plus the rule-table version. The rule
+        # tables are stored read-only (see _freeze): replacing one is the only way to
+        # change them, and that clears the cache.
+        self._cache = LRUCache(cache_size)
+        self._config_version = 0
+
         # Define intervention mappings based on risk factors
         self.intervention_map = {
             # Age-related interventions
@@ -168,18 +183,8 @@ class InterventionRecommender:
             'RX_ADH': {'low': 0.8}
         }
 
-    def extract_features(self, top_features: str) -> List[str]:
-        """Extract feature names from the top features string"""
-        if not top_features or top_features == 'N/A':
-            return []
-        
-        # Split by comma and clean up feature names
-        features = [f.strip() for f in top_features.split(',')]
-        return features
-
-    def get_feature_value(self, patient_data: Dict, feature: str) -> float:
-        """Get the value of a specific feature from patient data"""
-        feature_mapping = {
+        # Patient data keys holding the value of each thresholded feature
+        self.feature_mapping = {
             'AGE': 'AGE',
             'BMI': 'BMI',
             'BP_S': 'BP_S',
@@ -192,15 +197,35 @@ class InterventionRecommender:
             'ED_VISITS': 'ED_VISITS',
             'RX_ADH': 'RX_ADH'
         }
+
+    def extract_features(self, top_features: str) -> List[str]:
+        """Extract feature names from the top features string"""
+        if not top_features or top_features == 'N/A':
+            return []
         
-        data_key = feature_mapping.get(feature)
+        # Split by comma and clean up feature names
+        features = [f.strip() for f in top_features.split(',')]
+        return features
+
+    def get_feature_value(self, patient_data: Dict, feature: str) -> float:
+        """Get the value of a specific feature from patient data"""
+        data_key = self.feature_mapping.get(feature)
         if data_key and data_key in patient_data:
-            try:
-                return float(patient_data[data_key])
-            except (ValueError, TypeError):
-                return 0.0
+            return _to_float(patient_data[data_key])
         return 0.0
 
+    def get_feature_values(self, df: pd.DataFrame, feature: str) -> np.ndarray:
+        """Column-wise get_feature_value over a whole frame"""
+        data_key = self.feature_mapping.get(feature)
+        if not data_key or data_key not in df:
+            return np.zeros(len(df))
+
+        column = df[data_key]
+        if isinstance(column.dtype, np.dtype) and column.dtype.kind in 'biuf':
+            return column.to_numpy(dtype=float)
+        # Object and nullable dtypes: same per-value coercion as the scalar path (NA -> 0.0)
+        return np.array([_to_float(v) for v in column], dtype=float)
+
     def get_risk_level(self, feature: str, value: float) -> str:
         """Determine risk level for a feature based on its value"""
         thresholds = self.risk_thresholds.get(feature, {})
@@ -219,24 +244,118 @@ class InterventionRecommender:
         
         return 'normal'
 
+    @property
+    def intervention_map(self) -> Mapping:
+        return self._intervention_map
+
+    @intervention_map.setter
+    def intervention_map(self, value: Dict):
+        self._intervention_map = _freeze(value)
+        self.clear_cache()
+
+    @property
+    def risk_thresholds(self) -> Mapping:
+        return self._risk_thresholds
+
+    @risk_thresholds.setter
+    def risk_thresholds(self, value: Dict):
+        self._risk_thresholds = _freeze(value)
+        self.clear_cache()
+
+    @property
+    def feature_mapping(self) -> Mapping:
+        return self._feature_mapping
+
+    @feature_mapping.setter
+    def feature_mapping(self, value: Dict):
+        self._feature_mapping = _freeze(value)
+        self.clear_cache()
+
+    def clear_cache(self):
+        """Drop memoized recommendations (done automatically when a rule table is replaced)"""
+        # Bumping the version also keeps out entries built concurrently from the old tables
+        self._config_version += 1
+        self._cache.clear()
+
+    def cache_info(self) -> Dict:
+        """Hit/miss counters and size of the recommendation cache"""
+        return self._cache.stats()
+
+    def get_risk_levels(self, feature: str, values: np.ndarray) -> np.ndarray:
+        """Column-wise get_risk_level: one risk level string per value"""
+        thresholds = self.risk_thresholds.get(feature, {})
+        levels = np.full(len(values), 'normal', dtype=object)
+
+        if feature == 'AGE':
+            levels[values >= thresholds.get('moderate_risk', 65)] = 'moderate_risk'
+            levels[values >= thresholds.get('high_risk', 75)] = 'high_risk'
+        elif feature in ['BMI', 'BP_S', 'GLUCOSE', 'HbA1c', 'CHOLESTEROL', 'TOTAL_CLAIMS_COST', 'IN_ADM', 'OUT_VISITS', 'ED_VISITS']:
+            levels[values >= thresholds.get('high', float('inf'))] = 'high'
+        elif feature == 'RX_ADH':
+            levels[values <= thresholds.get('low', 0)] = 'low'
+
+        return levels
+
     def generate_recommendations(self, patient_data: Dict, top_features: str) -> List[str]:
         """Generate personalized intervention recommendations"""
+        features = self.extract_features(top_features)
+        risk_levels = []
+        for feature in features:
+            if isinstance(self.intervention_map.get(feature), Mapping):
+                value = self.get_feature_value(patient_data, feature)
+                risk_levels.append(self.get_risk_level(feature, value))
+            else:
+                risk_levels.append(None)
+
+        return self._cached_recommendations(features, risk_levels, patient_data.get('RISK_30D', 0))
+
+    def generate_recommendations_batch(self, df: pd.DataFrame, top_features: Sequence[str],
+                                       risk_30d: Sequence[float]) -> List[List[str]]:
+        """Generate recommendations for every row of a processed feature frame.
+
+        Row i uses df.iloc[i], top_features[i] and risk_30d[i]; the result is the
+        same as calling generate_recommendations on each row's dict.
+        """
+        # Risk levels for every thresholded feature, computed as whole columns
+        level_columns = {
+            feature: self.get_risk_levels(feature, self.get_feature_values(df, feature))
+            for feature, interventions in self.intervention_map.items()
+            if isinstance(interventions, Mapping)
+        }
+
+        parsed_features = {}
+        results = []
+        for i, (top, risk) in enumerate(zip(top_features, risk_30d)):
+            features = parsed_features.get(top)
+            if features is None:
+                features = parsed_features[top] = self.extract_features(top)
+            risk_levels = [level_columns[f][i] if f in level_columns else None for f in features]
+            results.append(self._cached_recommendations(features, risk_levels, risk))
+        return results
+
+    def _cached_recommendations(self, features: List[str], risk_levels: List, risk_30d: float) -> List[str]:
+        # Every score in a band picks the same general recommendations, so the band's
+        # lower bound stands in for the score both in the key and when building
+        band = next((floor for floor in RISK_30D_BANDS if risk_30d >= floor), 0)
+        key = (self._config_version, tuple(features), tuple(risk_levels), band)
+        recommendations = self._cache.get(key)
+        if recommendations is None:
+            recommendations = self._build_recommendations(features, risk_levels, band)
+            self._cache.put(key, recommendations)
+        return list(recommendations)
+
+    def _build_recommendations(self, features: List[str], risk_levels: List, risk_30d: float) -> List[str]:
+        """Combine the top features (with their risk levels) and the 30-day risk into recommendations"""
         recommendations = []
         seen_recommendations = set()
         
-        # Extract top features
-        features = self.extract_features(top_features)
-        
         # Add recommendations based on top features
-        for feature in features:
+        for feature, risk_level in zip(features, risk_levels):
             if feature in self.intervention_map:
                 interventions = self.intervention_map[feature]
                 
-                if isinstance(interventions, dict):
+                if isinstance(interventions, Mapping):
                     # Feature with risk-level specific interventions
-                    value = self.get_feature_value(patient_data, feature)
-                    risk_level = self.get_risk_level(feature, value)
-                    
                     if risk_level in interventions:
                         for intervention in interventions[risk_level]:
                             if intervention not in seen_recommendations:
@@ -250,7 +369,6 @@ class InterventionRecommender:
                             seen_recommendations.add(intervention)
         
         # Add risk-level based general recommendations
-        risk_30d = patient_data.get('RISK_30D', 0)
         if risk_30d >= 80:
             general_recommendations = [
                 "Immediate care coordination recommended",
@@ -296,6 +414,24 @@ class InterventionRecommender:
         
         return " | ".join(formatted)
 
+def _freeze(value):
+    """Read-only deep copy of a rule table: dicts become mappingproxies, lists tuples.
+
+    Editing a table in place would leave memoized recommendations built from the
+    old rules, so it raises TypeError instead; assign a new table to change rules.
+    """
+    if isinstance(value, Mapping):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+def _to_float(value) -> float:
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return 0.0
+
 # Global recommender instance
 recommender = InterventionRecommender()
 
@@ -303,3 +439,8 @@ def get_ai_recommendations(patient_data: Dict, top_features: str) -> str:
     """Get AI recommendations for a patient"""
     recommendations = recommender.generate_recommendations(patient_data, top_features)
     return recommender.format_recommendations(recommendations)
+
+def get_ai_recommendations_batch(df: pd.DataFrame, top_features: Sequence[str], risk_30d: Sequence[float]) -> List[str]:
+    """Get formatted AI recommendations for every row of a processed feature frame"""
+    batch = recommender.generate_recommendations_batch(df, top_features, risk_30d)
+    return [recommender.format_recommendations(recommendations) for recommendations in batch]
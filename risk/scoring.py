@@ -0,0 +1,168 @@
+"""
+Chunked scoring pipeline: read a chunk from the database, predict, explain,
+write it back, and move on, so memory stays flat regardless of table size.
+"""
+
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from risk.db import (count_rows, iter_table_chunks, ensure_prediction_columns, update_predictions_in_db_bulk,
+                     read_scoring_checkpoint, write_scoring_checkpoint, chunk_position,
+                     SCAN_START, MAX_ROWID)
+from risk.model import LoadedModel, get_model, predict_batch, versioned_model
+from risk.logger import logger
+
+DEFAULT_CHUNK_SIZE = 5000
+
+# Rows that still need a prediction (what /api/predict-all scores)
+UNSCORED_WHERE = (
+    "RISK_30D IS NULL OR RISK_60D IS NULL OR RISK_90D IS NULL "
+    "OR RISK_LABEL IS NULL OR TOP_3_FEATURES IS NULL"
+)
+
+# all: every row; unscored: rows without a prediction; stale: unscored rows plus
+# rows whose inputs changed or that were scored by another model
+SCORING_MODES = ("all", "unscored", "stale")
+
+def stale_where(model_version) -> str:
+    """Rows whose stored prediction may differ from what model_version would give now"""
+    condition = f"{UNSCORED_WHERE} OR FEATURE_HASH IS NULL OR MODEL_VERSION IS NULL"
+    if model_version is None:
+        return condition
+    if not str(model_version).isalnum():
+        raise ValueError(f"Unexpected model version {model_version!r}")
+    return f"{condition} OR MODEL_VERSION != '{model_version}'"
+
+def mode_where(mode: str, model_version=None):
+    """SQL row filter for a scoring mode (None for all rows)"""
+    if mode == "all":
+        return None
+    if mode == "unscored":
+        return UNSCORED_WHERE
+    if mode == "stale":
+        return stale_where(model_version)
+    raise ValueError(f"Unknown scoring mode {mode!r}, expected one of {', '.join(SCORING_MODES)}")
+
+# Model and predict_batch options held by each pool worker process, set once by _init_worker
+_worker_model = None
+_worker_predict_kwargs = {}
+
+def _init_worker(regressors, version, predict_kwargs):
+    global _worker_model, _worker_predict_kwargs
+    _worker_model = LoadedModel(regressors, version=version)
+    _worker_predict_kwargs = predict_kwargs
+
+def _predict_shard(shard):
+    return predict_batch(shard, _worker_model, **_worker_predict_kwargs)
+
+def make_worker_pool(model, workers: int, **predict_kwargs) -> ProcessPoolExecutor:
+    """Process pool whose workers each receive the model and predict_batch options once, at startup"""
+    # LoadedModel holds a lock, so ship the plain regressors and rewrap them in the worker
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(dict(model), getattr(model, "version", None), predict_kwargs),
+    )
+
+def predict_sharded(df: pd.DataFrame, pool: ProcessPoolExecutor, n_shards: int) -> pd.DataFrame:
+    """Split df into contiguous shards, predict them in the pool and merge in the original order"""
+    bounds = np.linspace(0, len(df), n_shards + 1).astype(int)
+    shards = [df.iloc[lo:hi] for lo, hi in zip(bounds[:-1], bounds[1:]) if hi > lo]
+    return pd.concat(pool.map(_predict_shard, shards))
+
+def iter_predictions(chunks, model, workers: int = 1, **predict_kwargs):
+    """Lazily run predict_batch over an iterable of DataFrames, optionally across worker processes"""
+    if workers <= 1:
+        for chunk in chunks:
+            yield predict_batch(chunk, model, **predict_kwargs)
+        return
+
+    with make_worker_pool(model, workers, **predict_kwargs) as pool:
+        for chunk in chunks:
+            yield predict_sharded(chunk, pool, workers)
+
+def _resume_point(table_name, scope, model_version):
+    """((DESYNPUF_ID, rowid) position, rows already done) to continue an interrupted run
+    with the same model from"""
+    checkpoint = read_scoring_checkpoint(table_name, scope)
+    if checkpoint is None or checkpoint["status"] == "completed":
+        return SCAN_START, 0
+    if model_version is None or checkpoint["model_version"] != model_version:
+        logger.info(f"Not resuming scoring of {table_name}: checkpoint was made with another model")
+        return SCAN_START, 0
+    # Checkpoints from before migration 10 only have the id: resume after every row with it
+    last_rowid = checkpoint["last_rowid"]
+    position = (checkpoint["last_id"], MAX_ROWID if last_rowid is None else last_rowid)
+    logger.info(f"Resuming scoring of {table_name} after {position[0]} (rowid {position[1]}) "
+                f"({checkpoint['rows_done']} rows already scored with model {model_version})")
+    return position, checkpoint["rows_done"]
+
+def score_table(table_name: str, model=None, chunk_size: int = DEFAULT_CHUNK_SIZE, where: str = None,
+                progress=None, workers: int = 1, resume: bool = True, mode: str = None) -> int:
+    """Score table rows (optionally filtered by a SQL condition) chunk by chunk.
+
+    mode, if given, picks the rows instead of where (see SCORING_MODES): "stale"
+    rescores only rows whose inputs changed or whose model version is not this
+    model's, so a routine rerun costs in proportion to what changed.
+
+    Predictions are committed after every chunk, and a checkpoint (the last
+    row's (DESYNPUF_ID, rowid) position, model version) is recorded in
+    scoring_checkpoints. If a run over the same table and filter was
+    interrupted, resume=True continues after its checkpoint when the model
+    version matches. With workers > 1 each chunk is
+    split into shards scored by a process pool. progress, if given, is called
+    as progress(rows_done, rows_total) after each chunk. Returns the rows scored.
+    """
+    ensure_prediction_columns(table_name)
+    # One model for the whole run, even if a new one is hot-reloaded meanwhile; a model
+    # without a version gets one, or its rows would never stop looking stale
+    model = versioned_model(model if model is not None else get_model())
+    model_version = getattr(model, "version", None)
+    if mode is not None:
+        where = mode_where(mode, model_version)
+    scope = where or ""
+
+    position, already_done = _resume_point(table_name, scope, model_version) if resume else (SCAN_START, 0)
+    remaining = count_rows(table_name, where, after=position)
+    total = already_done + remaining
+    logger.info(f"Scoring {remaining} rows from {table_name} in chunks of {chunk_size} with {workers} worker(s)")
+    if progress is not None:
+        progress(already_done, total)
+    if remaining == 0:
+        write_scoring_checkpoint(table_name, scope, position, model_version, "completed", already_done)
+        return 0
+
+    done = 0
+    start = time.perf_counter()
+    write_scoring_checkpoint(table_name, scope, position, model_version, "running", already_done)
+    # Position of each chunk read but not yet written back; iter_predictions yields
+    # one prediction frame per chunk, in order
+    positions = deque()
+
+    def tracked(chunks):
+        for chunk in chunks:
+            positions.append(chunk_position(chunk))
+            yield chunk
+
+    try:
+        chunks = tracked(iter_table_chunks(table_name, chunk_size=chunk_size, where=where, after=position))
+        for preds in iter_predictions(chunks, model, workers=workers):
+            update_predictions_in_db_bulk(preds, table_name)
+            done += len(preds)
+            # After the chunk's commit: a crash in between only redoes this chunk
+            position = positions.popleft()
+            write_scoring_checkpoint(table_name, scope, position, model_version, "running", already_done + done)
+
+            elapsed = time.perf_counter() - start
+            logger.info(f"Scored {already_done + done}/{total} rows ({done / elapsed:.0f} rows/s)")
+            if progress is not None:
+                progress(already_done + done, total)
+    except Exception:
+        write_scoring_checkpoint(table_name, scope, position, model_version, "failed", already_done + done)
+        raise
+
+    write_scoring_checkpoint(table_name, scope, position, model_version, "completed", already_done + done)
+    logger.success(f"Scored {done} rows from {table_name} in {time.perf_counter() - start:.1f}s")
+    return done
@@ -0,0 +1,58 @@
+"""
+Fast JSON serialization for patient rows returned by the API
+
+Rows are coerced column by column (null-filling and casting whole Series at
+once) and encoded with orjson when it is installed, falling back to the
+standard json module otherwise.
+"""
+
+import json
+from itertools import repeat
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# (JSON key, source column, kind, value used for NULLs)
+PATIENT_FIELDS = [
+    ("patient_id", "DESYNPUF_ID", "str", "nan"),
+    ("age", "AGE", "int", 0),
+    ("gender", "GENDER", "gender", None),
+    ("claims_cost", "TOTAL_CLAIMS_COST", "float", 0.0),
+    ("risk_30d", "RISK_30D", "int", 0),
+    ("risk_60d", "RISK_60D", "int", 0),
+    ("risk_90d", "RISK_90D", "int", 0),
+    ("risk_label", "RISK_LABEL", "str", "Unknown"),
+    ("top_features", "TOP_3_FEATURES", "str", "N/A"),
+    ("ai_recommendations", "AI_RECOMMENDATIONS", "str", "Continue current care plan"),
+    ("email", "EMAIL", "str", ""),
+]
+
+def _coerce(series: pd.Series, kind: str, null_value) -> list:
+    if kind == "gender":
+        return np.where(series == 1, "Male", "Female").tolist()
+    if kind == "int":
+        # int() truncates, and so does the cast from float
+        return pd.to_numeric(series, errors="coerce").fillna(null_value).astype(np.int64).tolist()
+    if kind == "float":
+        return pd.to_numeric(series, errors="coerce").fillna(null_value).astype(np.float64).tolist()
+    values = series.astype(object)
+    values = values.where(values.notna(), null_value)
+    if not pd.api.types.is_string_dtype(values):
+        values = values.map(str)
+    return values.tolist()
+
+def patient_records(df: pd.DataFrame) -> list:
+    """Dashboard rows as JSON-ready dicts of native Python values"""
+    keys = [key for key, _, _, _ in PATIENT_FIELDS]
+    columns = [_coerce(df[column], kind, null_value) for _, column, kind, null_value in PATIENT_FIELDS]
+    return list(map(dict, map(zip, repeat(keys), zip(*columns))))
+
+def dumps(obj) -> bytes:
+    """Encode obj as compact UTF-8 JSON"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
@@ -0,0 +1,36 @@
+import contextlib
+import importlib
+import io
+import pytest
+from benchmarks.common import make_synthetic_patients
+from risk import db, http_cache
+from risk.model import LoadedModel, train_models
+
+@pytest.fixture(scope="session")
+def model():
+    """Small model trained on synthetic patients, with a fixed registry version"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return LoadedModel(train_models(make_synthetic_patients(3000)), version="test")
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """risk.db pointed at an empty SQLite file, with fresh per-process caches"""
+    monkeypatch.setattr(db, "DATABASE_URL", f"sqlite:///{tmp_path / 'risk_data.db'}")
+    monkeypatch.setattr(db, "_engines", {})
+    monkeypatch.setattr(db, "_schema_cache", {})
+    monkeypatch.setattr(db, "_patient_cache", db.PatientCache())
+    yield db
+    for engine in db._engines.values():
+        engine.dispose()
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """(app module, Flask test client) with an empty response cache and a fixed data version"""
+    # app opens risk_data.db relative to the working directory at import time
+    monkeypatch.chdir(tmp_path)
+    app = importlib.import_module("app")
+    http_cache.clear_response_cache()
+    # No writes happen during the test, so every request sees the same data version
+    monkeypatch.setattr(http_cache, "get_data_version", lambda: (1, None))
+    yield app, app.app.test_client()
+    http_cache.clear_response_cache()
@@ -0,0 +1,34 @@
+"""
+/api/data query arguments: what reaches query_patient_page, and what is rejected.
+"""
+
+import pandas as pd
+import pytest
+from risk.db import PAGE_COLUMNS, MAX_PAGE_SIZE
+
+@pytest.fixture
+def page_args(client, monkeypatch):
+    app, test_client = client
+    calls = []
+    def query_patient_page(table_name, **kwargs):
+        calls.append(kwargs)
+        return pd.DataFrame(columns=PAGE_COLUMNS), None
+    monkeypatch.setattr(app, "query_patient_page", query_patient_page)
+
+    def get(query):
+        response = test_client.get(f"/api/data?{query}")
+        return response.status_code, calls.pop() if response.status_code == 200 else None
+    return get
+
+def test_age_range_with_default_sort(page_args):
+    status, args = page_args("age_min=50&age_max=70")
+    assert status == 200
+    assert (args["sort"], args["age_min"], args["age_max"]) == ("RISK_30D", 50, 70)
+
+@pytest.mark.parametrize("limit, expected", [("1000000", MAX_PAGE_SIZE), ("0", 1), ("250", 250)])
+def test_limit_is_capped(page_args, limit, expected):
+    status, args = page_args(f"limit={limit}")
+    assert status == 200 and args["limit"] == expected
+
+def test_unknown_gender_is_rejected(page_args):
+    assert page_args("gender=x")[0] == 400
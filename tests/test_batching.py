@@ -0,0 +1,87 @@
+"""
+MicroBatcher flushes a batch when it is full or when its oldest request's
+window closes, predicts each column set separately, and retries a failed
+batch request by request so only the bad request fails.
+"""
+
+import threading
+import time
+import pandas as pd
+import pytest
+from risk.batching import MicroBatcher
+
+class Recorder:
+    """predict_fn that doubles column a, records each call and can hold the worker"""
+
+    def __init__(self):
+        self.calls = []
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def __call__(self, df):
+        self.gate.wait(5)
+        self.calls.append(df.copy())
+        if (df["a"] < 0).any():
+            raise ValueError("negative a")
+        return pd.DataFrame({"out": df["a"] * 2})
+
+def frame(a, **columns):
+    return pd.DataFrame({"a": [a], **{name: [value] for name, value in columns.items()}})
+
+def hold_worker(batcher, predict):
+    """Block the worker in a first call, so later submissions queue into one batch"""
+    predict.gate.clear()
+    first = batcher.submit(frame(0))
+    while not batcher.batches:
+        time.sleep(0.001)
+    return first
+
+def test_flushes_partial_batch_at_deadline():
+    predict = Recorder()
+    batcher = MicroBatcher(predict, max_batch_size=32, max_wait_ms=100)
+    started = time.perf_counter()
+    futures = [batcher.submit(frame(a)) for a in (1, 2)]
+    assert [f.result(5)["out"].tolist() for f in futures] == [[2], [4]]
+    elapsed = time.perf_counter() - started
+    # Never filled: the batch went out when the window closed, not before
+    assert 0.09 <= elapsed < 2
+    assert [len(call) for call in predict.calls] == [2]
+
+def test_flushes_full_batch_without_waiting():
+    predict = Recorder()
+    batcher = MicroBatcher(predict, max_batch_size=2, max_wait_ms=10_000)
+    started = time.perf_counter()
+    futures = [batcher.submit(frame(a)) for a in (1, 2)]
+    assert [f.result(5)["out"].tolist() for f in futures] == [[2], [4]]
+    assert time.perf_counter() - started < 2
+
+def test_groups_by_column_set():
+    predict = Recorder()
+    batcher = MicroBatcher(predict, max_batch_size=32, max_wait_ms=1)
+    first = hold_worker(batcher, predict)
+    futures = [batcher.submit(frame(1, b=1)), batcher.submit(frame(2, c=1)), batcher.submit(frame(3, b=2))]
+    predict.gate.set()
+    assert first.result(5)["out"].tolist() == [0]
+    assert [f.result(5)["out"].tolist() for f in futures] == [[2], [4], [6]]
+
+    # One batch, one call per column set, and no NaN from mixing them
+    assert batcher.stats()["batch_sizes"] == {1: 1, 3: 1}
+    grouped = predict.calls[1:]
+    assert [list(call.columns) for call in grouped] == [["a", "b"], ["a", "c"]]
+    assert [call["a"].tolist() for call in grouped] == [[1, 3], [2]]
+    assert not any(call.isna().any().any() for call in grouped)
+
+def test_failed_batch_is_retried_per_request():
+    predict = Recorder()
+    batcher = MicroBatcher(predict, max_batch_size=32, max_wait_ms=1)
+    first = hold_worker(batcher, predict)
+    good, bad, other = batcher.submit(frame(1)), batcher.submit(frame(-1)), batcher.submit(frame(3))
+    predict.gate.set()
+    first.result(5)
+
+    assert good.result(5)["out"].tolist() == [2]
+    assert other.result(5)["out"].tolist() == [6]
+    with pytest.raises(ValueError, match="negative a"):
+        bad.result(5)
+    # The batch of three, then each request on its own
+    assert [call["a"].tolist() for call in predict.calls[1:]] == [[1, -1, 3], [1], [-1], [3]]
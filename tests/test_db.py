@@ -0,0 +1,193 @@
+"""
+Chunked scans and dashboard pages of the patient table. Scans return every
+row exactly once, in (DESYNPUF_ID, rowid) order, even across runs of
+duplicate ids; walking the keyset pages gives the same rows as one plain
+ORDER BY, whatever the page size, filters and cursor positions. Cached patient
+lookups see writes from other processes at the next data version check.
+"""
+
+import base64
+import sqlite3
+import numpy as np
+import pandas as pd
+import pytest
+from benchmarks.common import make_synthetic_patients
+from risk.db import (SCAN_START, MAX_ROWID, count_rows, chunk_position, iter_table_chunks, query_patient_page,
+                     encode_cursor, decode_cursor, PatientCache, get_patient_by_id, update_patient_email)
+from risk.migrations import apply_migrations
+
+@pytest.fixture
+def patients(database):
+    df = make_synthetic_patients(40)
+    # Runs of duplicate ids, which migration 2 accepts with a non-unique index
+    df.loc[5:14, "DESYNPUF_ID"] = df.loc[5, "DESYNPUF_ID"]
+    df.loc[20:22, "DESYNPUF_ID"] = df.loc[20, "DESYNPUF_ID"]
+    engine = database.get_engine()
+    df.to_sql("risk_training", engine, index=False)
+    apply_migrations(engine, "risk_training")
+    return engine
+
+def scan_order(engine, where="1"):
+    return pd.read_sql(f"SELECT rowid, DESYNPUF_ID FROM risk_training WHERE {where} ORDER BY DESYNPUF_ID, rowid", engine)
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 40, 100])
+def test_chunks_cover_duplicate_ids(patients, chunk_size):
+    chunks = list(iter_table_chunks("risk_training", chunk_size=chunk_size))
+    assert all(len(chunk) <= chunk_size for chunk in chunks)
+    scanned = pd.concat(chunks)
+    expected = scan_order(patients)
+    assert scanned.index.tolist() == expected["rowid"].tolist()
+    assert scanned["DESYNPUF_ID"].tolist() == expected["DESYNPUF_ID"].tolist()
+
+def test_chunks_resume_after_position(patients):
+    expected = scan_order(patients, "AGE >= 50")
+    first = next(iter_table_chunks("risk_training", chunk_size=4, where="AGE >= 50"))
+    position = chunk_position(first)
+    rest = pd.concat(iter_table_chunks("risk_training", chunk_size=4, where="AGE >= 50", after=position))
+    assert first.index.tolist() + rest.index.tolist() == expected["rowid"].tolist()
+    assert count_rows("risk_training", "AGE >= 50", after=position) == len(rest)
+    assert count_rows("risk_training", "AGE >= 50", after=SCAN_START) == len(expected)
+
+def test_max_rowid_skips_the_whole_id(patients):
+    duplicated = scan_order(patients)["DESYNPUF_ID"].value_counts().idxmax()
+    rest = pd.concat(iter_table_chunks("risk_training", chunk_size=5, after=(duplicated, MAX_ROWID)))
+    assert (rest["DESYNPUF_ID"] > duplicated).all()
+
+def test_age_range_with_default_sort(patients):
+    df, _ = query_patient_page("risk_training", limit=100, age_min=50, age_max=70)
+    expected = pd.read_sql("SELECT DESYNPUF_ID FROM risk_training WHERE AGE BETWEEN 50 AND 70 "
+                           "ORDER BY RISK_30D DESC, DESYNPUF_ID", patients)
+    assert df["DESYNPUF_ID"].tolist() == expected["DESYNPUF_ID"].tolist()
+
+LABELS = ["Very High Risk", "High Risk", "Moderate Risk", "Low Risk"]
+
+@pytest.fixture
+def scored(database):
+    """Unique ids, many tied risk values, some NULL ones, labels and a few emails"""
+    df = make_synthetic_patients(120, seed=5)
+    df["RISK_30D"] = df["RISK_30D"] // 10  # ~10 rows per value
+    df["RISK_LABEL"] = [LABELS[i % len(LABELS)] for i in range(len(df))]
+    df["EMAIL"] = [f"p{i}@example.com" if i % 3 == 0 else None for i in range(len(df))]
+    df = df.astype({"RISK_30D": "Int64", "TOTAL_CLAIMS_COST": "Float64"})
+    df.loc[df.index % 9 == 0, "RISK_30D"] = pd.NA
+    df.loc[df.index % 11 == 0, "TOTAL_CLAIMS_COST"] = pd.NA
+    engine = database.get_engine()
+    df.to_sql("risk_training", engine, index=False)
+    apply_migrations(engine, "risk_training")
+    return engine
+
+def expected_order(engine, sort, direction, where="1"):
+    """Plain ORDER BY equivalent of a page walk: non-NULL values by sort with ties on
+    DESYNPUF_ID the other way round, then NULL values by DESYNPUF_ID"""
+    tie = "DESC" if direction == "asc" else "ASC"
+    query = (f"SELECT DESYNPUF_ID FROM risk_training WHERE {where} ORDER BY {sort} IS NULL, "
+             f"{sort} {direction.upper()}, CASE WHEN {sort} IS NULL THEN DESYNPUF_ID END, DESYNPUF_ID {tie}")
+    return pd.read_sql(query, engine)["DESYNPUF_ID"].tolist()
+
+def walk_pages(limit, **kwargs):
+    ids, pages, cursor = [], 0, None
+    while True:
+        df, cursor = query_patient_page("risk_training", limit=limit, cursor=cursor, **kwargs)
+        assert len(df) <= limit
+        ids += df["DESYNPUF_ID"].tolist()
+        pages += 1
+        assert pages <= 200, "cursor does not advance"
+        if cursor is None:
+            return ids, pages
+
+@pytest.mark.parametrize("sort", ["RISK_30D", "TOTAL_CLAIMS_COST", "AGE"])
+@pytest.mark.parametrize("direction", ["desc", "asc"])
+@pytest.mark.parametrize("limit", [1, 7, 13, 120, 500])
+def test_pages_match_order_by(scored, sort, direction, limit):
+    ids, _ = walk_pages(limit, sort=sort, direction=direction)
+    assert ids == expected_order(scored, sort, direction)
+
+@pytest.mark.parametrize("sort", ["RISK_30D", "AGE"])
+@pytest.mark.parametrize("labels", [["High Risk"], ["Very High Risk", "Low Risk"], LABELS, ["No Such Label"]])
+def test_label_pages_merge_in_sort_order(scored, sort, labels):
+    where = f"RISK_LABEL IN ({', '.join(repr(label) for label in labels)})"
+    for direction in ("desc", "asc"):
+        ids, _ = walk_pages(6, sort=sort, direction=direction, risk_labels=labels)
+        assert ids == expected_order(scored, sort, direction, where)
+
+def test_filters_combine(scored):
+    ids, _ = walk_pages(5, risk_labels=["High Risk", "Low Risk"], has_email=True, gender=1, age_min=40)
+    where = "RISK_LABEL IN ('High Risk', 'Low Risk') AND EMAIL IS NOT NULL AND GENDER = 1 AND AGE >= 40"
+    assert ids == expected_order(scored, "RISK_30D", "desc", where)
+
+def test_next_cursor_edges(scored):
+    total = len(expected_order(scored, "RISK_30D", "desc"))
+    # A full last page still gets a cursor; the page after it is empty and ends the walk
+    ids, pages = walk_pages(total // 2, sort="RISK_30D")
+    assert len(ids) == total and pages == 3
+    # A short last page ends the walk itself
+    assert walk_pages(total - 1)[1] == 2
+    df, cursor = query_patient_page("risk_training", limit=total + 1)
+    assert len(df) == total and cursor is None
+    # Nothing matches: one empty page, no cursor
+    df, cursor = query_patient_page("risk_training", risk_labels=["No Such Label"])
+    assert df.empty and cursor is None
+
+def test_cursor_into_null_phase(scored):
+    non_null = pd.read_sql("SELECT COUNT(*) AS n FROM risk_training WHERE RISK_30D IS NOT NULL", scored)["n"][0]
+    # The page that ends exactly on the last non-NULL value, then one starting in the NULL rows
+    first, cursor = query_patient_page("risk_training", limit=int(non_null))
+    second, cursor = query_patient_page("risk_training", limit=3, cursor=cursor)
+    assert first["RISK_30D"].notna().all() and second["RISK_30D"].isna().all()
+    assert decode_cursor(cursor)[0] is None
+    third, _ = query_patient_page("risk_training", limit=3, cursor=cursor)
+    assert first["DESYNPUF_ID"].tolist() + second["DESYNPUF_ID"].tolist() + third["DESYNPUF_ID"].tolist() \
+        == expected_order(scored, "RISK_30D", "desc")[:int(non_null) + 6]
+
+def b64(raw):
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", b64("[5, 7]"), b64('["high", "A1"]'), b64('{"a": 1}')])
+def test_invalid_cursor(scored, cursor):
+    with pytest.raises(ValueError):
+        query_patient_page("risk_training", cursor=cursor)
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(pd.NA, "A1")) == (None, "A1")
+    assert decode_cursor(encode_cursor(np.int64(42), "B2")) == (42, "B2")
+    assert decode_cursor(encode_cursor(12.5, "C3")) == (12.5, "C3")
+
+@pytest.fixture
+def patient_cache(patients, database, monkeypatch):
+    """Patient cache that checks the data version once an hour, and the ids of two distinct patients"""
+    cache = PatientCache(check_interval=3600)
+    monkeypatch.setattr(database, "_patient_cache", cache)
+    ids = scan_order(patients)["DESYNPUF_ID"].drop_duplicates(keep=False).tolist()[:2]
+    return cache, ids
+
+def test_patient_cache_checks_version_once_per_interval(patient_cache, database, monkeypatch):
+    cache, (patient_id, _) = patient_cache
+    checks = []
+    get_data_version = database.get_data_version
+    monkeypatch.setattr(database, "get_data_version", lambda: checks.append(1) or get_data_version())
+    for _ in range(50):
+        assert get_patient_by_id(patient_id)["DESYNPUF_ID"] == patient_id
+    assert len(checks) == 1
+    assert cache.stats()["hits"] == 49
+
+def test_patient_cache_sees_direct_write_at_next_check(patient_cache, patients):
+    cache, (patient_id, _) = patient_cache
+    assert get_patient_by_id(patient_id)["EMAIL"] is None
+    # As add_emails_to_top_patients.py does
+    with sqlite3.connect(patients.url.database) as conn:
+        conn.execute("UPDATE risk_training SET EMAIL = ? WHERE DESYNPUF_ID = ?", ("a@example.com", patient_id))
+    # Stale until the interval is up, then the version check drops the row
+    assert get_patient_by_id(patient_id)["EMAIL"] is None
+    cache.check_interval = 0
+    assert get_patient_by_id(patient_id)["EMAIL"] == "a@example.com"
+
+def test_own_write_keeps_other_rows_cached(patient_cache):
+    cache, (patient_id, other_id) = patient_cache
+    cache.check_interval = 0
+    get_patient_by_id(patient_id)
+    get_patient_by_id(other_id)
+    assert update_patient_email(patient_id, "b@example.com")
+    hits = cache.stats()["hits"]
+    assert get_patient_by_id(other_id)["DESYNPUF_ID"] == other_id
+    assert cache.stats()["hits"] == hits + 1
+    assert get_patient_by_id(patient_id)["EMAIL"] == "b@example.com"
@@ -0,0 +1,83 @@
+"""
+export_model folds StandardScaler into the split thresholds; the exported
+forests must predict and explain exactly like the pipelines they came from,
+including for feature values sitting right on a split.
+"""
+
+import contextlib
+import io
+import numpy as np
+import pytest
+from benchmarks.common import make_synthetic_patients
+from risk.model import (ENGINES, train_models, export_model, check_export_equivalence, get_compiled,
+                        horizon_pipeline, model_inputs, predict_risks, explain_risk, top_k_features)
+from risk.preprocess import preprocess_features, feature_cols, target_cols
+
+@pytest.fixture(scope="module", params=ENGINES)
+def models(request):
+    with contextlib.redirect_stdout(io.StringIO()):
+        regressors = train_models(make_synthetic_patients(3000), engine=request.param)
+    return regressors, export_model(regressors)
+
+def features(n, seed):
+    return preprocess_features(make_synthetic_patients(n, seed=seed))[feature_cols].to_numpy(dtype=float)
+
+def splits(regressors):
+    """(feature, threshold, scaler) for every split of every distinct pipeline"""
+    pipelines = {id(p): p for p in (horizon_pipeline(regressors, col)[0] for col in target_cols)}
+    for pipeline in pipelines.values():
+        for est in pipeline.named_steps["rf"].estimators_:
+            tree = est.tree_
+            internal = tree.feature >= 0
+            for f, t in zip(tree.feature[internal], tree.threshold[internal]):
+                yield f, t, pipeline.named_steps["scaler"]
+
+def on_split_thresholds(regressors, exported, base):
+    """Copies of base with one feature set on or right next to each split.
+
+    Covers every folded threshold with the float32 values either side, and each
+    scaled threshold mapped back to raw units at the data's two-decimal precision
+    (e.g. an age of 70.5 or an adherence of 0.46 falling exactly on a split).
+    """
+    values = []
+    for f, t, _ in splits(exported):
+        t = np.float32(t)
+        values += [(f, v) for v in (np.nextafter(t, np.float32(-np.inf)), t, np.nextafter(t, np.float32(np.inf)))]
+    for f, t, scaler in splits(regressors):
+        raw = round(t * scaler.scale_[f] + scaler.mean_[f], 2)
+        values += [(f, v) for v in (raw - 0.01, raw, raw + 0.01)]
+
+    rows = np.repeat(base[None, :], len(values), axis=0)
+    for i, (f, v) in enumerate(values):
+        rows[i, f] = v
+    return model_inputs(rows)
+
+def assert_equivalent(regressors, exported, X):
+    np.testing.assert_allclose(predict_risks(exported, X), predict_risks(regressors, X), rtol=0, atol=1e-9)
+    before = explain_risk(regressors, X, "RISK_30D")
+    after = explain_risk(exported, X, "RISK_30D")
+    np.testing.assert_allclose(after, before, rtol=0, atol=1e-9)
+    np.testing.assert_array_equal(top_k_features(after)[0], top_k_features(before)[0])
+
+def test_export_matches_pipelines(models):
+    regressors, exported = models
+    assert_equivalent(regressors, exported, model_inputs(features(2000, seed=1)))
+
+def test_export_matches_on_split_thresholds(models):
+    regressors, exported = models
+    X = on_split_thresholds(regressors, exported, features(1, seed=2)[0])
+    assert_equivalent(regressors, exported, X)
+    # CompiledForest folds the same way
+    np.testing.assert_allclose(get_compiled(regressors).predict(X), predict_risks(regressors, X), rtol=0, atol=1e-9)
+
+def test_check_export_equivalence(models):
+    regressors, exported = models
+    X = features(500, seed=3)
+    assert check_export_equivalence(regressors, exported, X) <= 1e-6
+
+    # An export whose RISK_30D splits were moved must be rejected
+    broken = export_model(regressors)
+    for est in horizon_pipeline(broken, "RISK_30D")[0].named_steps["rf"].estimators_:
+        est.tree_.threshold[est.tree_.feature >= 0] += 1.0
+    with pytest.raises(ValueError):
+        check_export_equivalence(regressors, broken, X)
@@ -0,0 +1,89 @@
+"""
+A failed database read must not be cached: once the database is back, the
+next request to a cached dashboard API gets real data, not the error. Cached
+responses follow the data version, which triggers bump on every write,
+including ones made with sqlite3 outside risk.db.
+"""
+
+import sqlite3
+import pandas as pd
+import pytest
+from benchmarks.common import make_synthetic_patients
+from risk import http_cache
+from risk.db import PAGE_COLUMNS, get_data_version, update_patient_email
+from risk.migrations import apply_migrations
+
+def fail_once(result):
+    calls = []
+    def fn(*args, **kwargs):
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("database is locked")
+        return result
+    return fn
+
+def test_data_error_is_not_cached(client, monkeypatch):
+    app, test_client = client
+    page = pd.DataFrame([dict.fromkeys(PAGE_COLUMNS)]).assign(DESYNPUF_ID="A", RISK_30D=50)
+    monkeypatch.setattr(app, "query_patient_page", fail_once((page, None)))
+
+    first = test_client.get("/api/data")
+    assert first.status_code == 500
+    second = test_client.get("/api/data")
+    assert second.status_code == 200
+    assert second.get_json()["data"][0]["patient_id"] == "A"
+
+def test_summary_error_is_not_cached(client, monkeypatch):
+    app, test_client = client
+    summary = pd.DataFrame({"RISK_LABEL": ["High Risk"], "n": [2], "n_30d": [2], "sum_30d": [130],
+                            "n_60d": [2], "sum_60d": [140], "n_90d": [2], "sum_90d": [150],
+                            "n_age": [2], "sum_age": [150]})
+    monkeypatch.setattr(app, "read_risk_summary", fail_once(summary))
+
+    first = test_client.get("/api/summary")
+    assert first.status_code == 500
+    second = test_client.get("/api/summary")
+    assert second.status_code == 200
+    assert second.get_json()["total_patients"] == 2
+    assert second.get_json()["high_risk"] == 2
+
+@pytest.fixture
+def served(database, client, monkeypatch):
+    """Flask test client over a migrated patient table, with the real data version"""
+    engine = database.get_engine()
+    make_synthetic_patients(20).to_sql("risk_training", engine, index=False)
+    apply_migrations(engine, "risk_training")
+    monkeypatch.setattr(http_cache, "get_data_version", get_data_version)
+    return client[1], engine.url.database
+
+def emails(response):
+    return {row["patient_id"]: row["email"] for row in response.get_json()["data"]}
+
+def test_direct_write_invalidates_cached_page(served):
+    test_client, path = served
+    first = test_client.get("/api/data?limit=5")
+    patient_id = next(iter(emails(first)))
+    assert test_client.get("/api/data?limit=5", headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+
+    # As add_emails_to_top_patients.py does
+    version = get_data_version()[0]
+    with sqlite3.connect(path) as conn:
+        conn.execute("UPDATE risk_training SET EMAIL = ? WHERE DESYNPUF_ID = ?", ("a@example.com", patient_id))
+    assert get_data_version()[0] == version + 1
+
+    second = test_client.get("/api/data?limit=5", headers={"If-None-Match": first.headers["ETag"]})
+    assert second.status_code == 200
+    assert emails(second)[patient_id] == "a@example.com"
+
+def test_module_write_bumps_version_once(served):
+    version = get_data_version()[0]
+    patient_id = served[0].get("/api/data?limit=1").get_json()["data"][0]["patient_id"]
+    assert update_patient_email(patient_id, "b@example.com")
+    assert get_data_version()[0] == version + 1
+
+def test_large_body_is_not_cached(served, monkeypatch):
+    test_client, _ = served
+    monkeypatch.setattr(http_cache, "MAX_CACHED_BODY_BYTES", 512)
+    assert len(test_client.get("/api/data?limit=20").get_data()) > 512
+    assert test_client.get("/api/data?limit=1").status_code == 200
+    assert http_cache.response_cache_stats()["size"] == 1
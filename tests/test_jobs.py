@@ -0,0 +1,94 @@
+"""
+JobRunner returns the active job for a key instead of starting another,
+records a failure's error, reports progress with throughput and ETA while
+a job runs, and keeps only the last `history` finished jobs.
+"""
+
+import threading
+import time
+import pytest
+from risk.jobs import JobRunner
+
+def wait_for(job, timeout=5):
+    deadline = time.monotonic() + timeout
+    while job.active:
+        assert time.monotonic() < deadline, f"job {job.id} still {job.status}"
+        time.sleep(0.005)
+    return job.to_dict()
+
+def blocking(release, result=None, on_start=None):
+    def fn(progress):
+        if on_start is not None:
+            on_start(progress)
+        release.wait(5)
+        return result
+    return fn
+
+@pytest.fixture
+def runner():
+    runner = JobRunner(max_workers=2)
+    yield runner
+    runner._pool.shutdown(wait=True)
+
+def test_same_key_coalesces_while_active(runner):
+    release = threading.Event()
+    job, created = runner.submit("score:risk_training", blocking(release, result={"rows": 1}))
+    again, created_again = runner.submit("score:risk_training", blocking(release))
+    other, created_other = runner.submit("score:other", blocking(release))
+    assert created and not created_again and again is job
+    assert created_other and other is not job
+
+    release.set()
+    assert wait_for(job)["result"] == {"rows": 1}
+    wait_for(other)
+    # Finished jobs no longer absorb submissions
+    rerun, created = runner.submit("score:risk_training", lambda progress: None)
+    assert created and rerun is not job
+    wait_for(rerun)
+    assert runner.get(job.id) is job
+
+def test_failed_job_reports_error(runner):
+    def fn(progress):
+        progress(10, 100)
+        raise RuntimeError("database is locked")
+    job, _ = runner.submit("score:risk_training", fn)
+    state = wait_for(job)
+    assert state["status"] == "failed"
+    assert state["error"] == "database is locked"
+    assert state["result"] is None and state["eta_seconds"] is None
+    assert state["rows_processed"] == 10
+
+def test_progress_throughput_and_eta(runner):
+    release, started = threading.Event(), threading.Event()
+    def on_start(progress):
+        progress(25, 100)
+        time.sleep(0.05)
+        started.set()
+    job, _ = runner.submit("score:risk_training", blocking(release, result="done", on_start=on_start))
+    assert job.to_dict()["status"] in ("queued", "running")
+    assert started.wait(5)
+
+    state = job.to_dict()
+    assert state["status"] == "running"
+    assert (state["rows_processed"], state["total_rows"], state["percent"]) == (25, 100, 25.0)
+    assert state["elapsed_seconds"] >= 0.05
+    assert 0 < state["rows_per_second"] <= 25 / 0.05
+    # Remaining rows at the current rate, to the 0.1s the ETA is rounded to
+    assert state["eta_seconds"] == pytest.approx(75 / state["rows_per_second"], abs=0.1)
+
+    release.set()
+    state = wait_for(job)
+    assert state["status"] == "succeeded" and state["result"] == "done"
+    assert state["eta_seconds"] is None
+
+def test_history_keeps_last_finished_jobs():
+    runner = JobRunner(max_workers=1, history=2)
+    jobs = []
+    for i in range(4):
+        job, _ = runner.submit(f"job:{i}", lambda progress: None)
+        wait_for(job)
+        jobs.append(job)
+    runner.submit("job:last", lambda progress: None)
+    runner._pool.shutdown(wait=True)
+    assert [job.key for job in runner.jobs()] == ["job:3", "job:last"]
+    assert runner.get(jobs[0].id) is None
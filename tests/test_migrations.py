@@ -0,0 +1,103 @@
+"""
+Schema migrations applied to a fresh table, and the summary and stamp
+triggers they install kept in step with inserts, updates and deletes.
+"""
+
+import pandas as pd
+import pytest
+from sqlalchemy import text
+from benchmarks.common import make_synthetic_patients
+from risk.migrations import (MIGRATIONS, SUMMARY_MEASURES, apply_migrations, applied_versions, reset_migrations,
+                             summary_table_name, table_columns)
+
+TABLE = "risk_training"
+
+def index_names(conn):
+    return {row[0] for row in conn.execute(
+        text("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :table"), {"table": TABLE})}
+
+@pytest.fixture
+def engine(database):
+    df = make_synthetic_patients(200, seed=11)
+    df["RISK_LABEL"] = pd.cut(df["RISK_30D"], [-1, 20, 40, 60, 80, 100],
+                              labels=["Very Low Risk", "Low Risk", "Moderate Risk", "High Risk", "Very High Risk"])
+    df["RISK_LABEL"] = df["RISK_LABEL"].astype(object)
+    df.loc[df.index % 17 == 0, "RISK_LABEL"] = None
+    df.loc[df.index % 13 == 0, "RISK_60D"] = None
+    engine = database.get_engine()
+    df.to_sql(TABLE, engine, index=False)
+    return engine
+
+def test_migrations_apply_once_in_order(engine):
+    assert apply_migrations(engine, TABLE) == [version for version, _, _ in MIGRATIONS]
+    assert apply_migrations(engine, TABLE) == []
+    with engine.connect() as conn:
+        assert applied_versions(conn, TABLE) == {version for version, _, _ in MIGRATIONS}
+        columns = set(table_columns(conn, TABLE))
+        assert {"AI_RECOMMENDATIONS", "EMAIL", "FEATURE_HASH", "MODEL_VERSION"} <= columns
+        assert "last_rowid" in table_columns(conn, "scoring_checkpoints")
+        assert index_names(conn) == {
+            f"ux_{TABLE}_patient_id", f"ix_{TABLE}_risk_30d", f"ix_{TABLE}_risk_60d", f"ix_{TABLE}_risk_90d",
+            f"ix_{TABLE}_age", f"ix_{TABLE}_total_claims_cost", f"ix_{TABLE}_label_risk_30d",
+        }
+
+def test_duplicate_ids_get_a_plain_index(engine):
+    with engine.begin() as conn:
+        conn.execute(text(f"UPDATE {TABLE} SET DESYNPUF_ID = 'DUP' WHERE rowid <= 2"))
+    apply_migrations(engine, TABLE)
+    with engine.connect() as conn:
+        names = index_names(conn)
+    assert f"ix_{TABLE}_patient_id" in names and f"ux_{TABLE}_patient_id" not in names
+
+def test_reset_reapplies_to_recreated_table(engine):
+    apply_migrations(engine, TABLE)
+    make_synthetic_patients(10).to_sql(TABLE, engine, index=False, if_exists="replace")
+    reset_migrations(engine, TABLE)
+    assert len(apply_migrations(engine, TABLE)) == len(MIGRATIONS)
+
+def summary_mismatch(engine):
+    """Rows where the trigger-kept summary differs from a GROUP BY over the table"""
+    aggregates = ", ".join(f"COUNT({source}) AS {n_col}, COALESCE(SUM({source}), 0) AS {sum_col}"
+                           for n_col, sum_col, source in SUMMARY_MEASURES)
+    expected = pd.read_sql(f"SELECT COALESCE(RISK_LABEL, '') AS RISK_LABEL, COUNT(*) AS n, {aggregates} "
+                           f"FROM {TABLE} GROUP BY 1 ORDER BY 1", engine)
+    kept = pd.read_sql(f"SELECT * FROM {summary_table_name(TABLE)} WHERE n > 0 ORDER BY RISK_LABEL", engine)
+    numeric = {col: float for col in expected.columns if col != "RISK_LABEL"}
+    kept, expected = kept[expected.columns].astype(numeric), expected.astype(numeric)
+    return pd.concat([kept, expected]).drop_duplicates(keep=False)
+
+def test_summary_follows_writes(engine):
+    apply_migrations(engine, TABLE)
+    assert summary_mismatch(engine).empty  # backfill
+
+    extra = make_synthetic_patients(30, seed=12).assign(RISK_LABEL="High Risk")
+    extra.loc[:4, "RISK_LABEL"] = None
+    extra.loc[5:9, ["RISK_30D", "AGE"]] = None
+    extra.to_sql(TABLE, engine, index=False, if_exists="append")
+    assert summary_mismatch(engine).empty
+
+    writes = [
+        "UPDATE {t} SET RISK_30D = RISK_30D + 7 WHERE rowid % 3 = 0",
+        "UPDATE {t} SET RISK_LABEL = 'Low Risk' WHERE rowid % 5 = 0",
+        "UPDATE {t} SET RISK_LABEL = 'Under Review' WHERE rowid % 11 = 0",  # a label with no row yet
+        "UPDATE {t} SET RISK_LABEL = NULL, RISK_90D = NULL WHERE rowid % 7 = 0",
+        "UPDATE {t} SET AGE = AGE + 1, RISK_60D = 50 WHERE RISK_LABEL IS NULL",
+        "UPDATE {t} SET BMI = BMI + 1",  # not a summarised column
+        "UPDATE {t} SET RISK_LABEL = RISK_LABEL",  # no effective change
+        "DELETE FROM {t} WHERE rowid % 4 = 0",
+        "DELETE FROM {t} WHERE RISK_LABEL = 'Moderate Risk'",
+    ]
+    for write in writes:
+        with engine.begin() as conn:
+            conn.execute(text(write.format(t=TABLE)))
+        assert summary_mismatch(engine).empty, write
+
+def test_feature_change_clears_stamp(engine):
+    apply_migrations(engine, TABLE)
+    with engine.begin() as conn:
+        conn.execute(text(f"UPDATE {TABLE} SET FEATURE_HASH = 'h', MODEL_VERSION = 'm'"))
+        conn.execute(text(f"UPDATE {TABLE} SET GLUCOSE = GLUCOSE + 1 WHERE rowid = 1"))  # a model input
+        conn.execute(text(f"UPDATE {TABLE} SET GLUCOSE = GLUCOSE WHERE rowid = 2"))  # unchanged value
+        conn.execute(text(f"UPDATE {TABLE} SET BMI = 40, EMAIL = 'x@example.com' WHERE rowid = 3"))  # not inputs
+        stamps = dict(conn.execute(text(f"SELECT rowid, FEATURE_HASH FROM {TABLE} WHERE rowid <= 3")).fetchall())
+    assert stamps == {1: None, 2: "h", 3: "h"}
@@ -0,0 +1,67 @@
+"""
+predict_batch's prediction cache: entries are keyed on (model version,
+feature fingerprint), survive in the SQLite tier across cache instances,
+and are never used for a model without a version.
+"""
+
+import pandas as pd
+import pytest
+from benchmarks.common import make_synthetic_patients
+from risk.model import LoadedModel, PredictionCache, predict_batch
+
+@pytest.fixture
+def patients():
+    df = make_synthetic_patients(20)
+    # Every feature vector twice, under different patient ids
+    twins = df.assign(DESYNPUF_ID=df["DESYNPUF_ID"] + "-2")
+    return pd.concat([df, twins], ignore_index=True)
+
+def counts(cache):
+    batch = cache.stats()["last_batch"]
+    return batch["hits"], batch["computed"]
+
+def test_hits_keyed_on_version_and_features(model, patients):
+    expected = predict_batch(patients, model, cache=None)
+    cache = PredictionCache(maxsize=100)
+
+    assert predict_batch(patients, model, cache=cache).equals(expected)
+    assert counts(cache) == (0, 20)  # each distinct vector computed once
+    assert predict_batch(patients, model, cache=cache).equals(expected)
+    assert counts(cache) == (40, 0)
+
+    # Same regressors under another version: nothing carries over
+    retrained = LoadedModel(dict(model), version="test-2")
+    predict_batch(patients, retrained, cache=cache)
+    assert counts(cache) == (0, 20)
+
+    # One changed input: only its two rows miss
+    edited = patients.copy()
+    edited.loc[[0, 20], "GLUCOSE"] += 40
+    assert predict_batch(edited, model, cache=cache).equals(predict_batch(edited, model, cache=None))
+    assert counts(cache) == (38, 1)
+
+def test_sqlite_tier_is_shared_across_instances(model, patients, tmp_path):
+    path = str(tmp_path / "prediction_cache.db")
+    expected = predict_batch(patients, model, cache=PredictionCache(maxsize=100, path=path))
+
+    # Empty memory tier, same file: every vector comes from disk, then from memory
+    cache = PredictionCache(maxsize=100, path=path)
+    assert predict_batch(patients, model, cache=cache).equals(expected)
+    assert counts(cache) == (40, 0) and cache.stats()["disk_hits"] == 20
+    predict_batch(patients, model, cache=cache)
+    assert cache.stats()["disk_hits"] == 20
+
+    other = PredictionCache(maxsize=100, path=path)
+    predict_batch(patients, LoadedModel(dict(model), version="test-2"), cache=other)
+    assert counts(other) == (0, 20) and other.stats()["disk_hits"] == 0
+
+def test_no_cache_without_model_version(model, patients, tmp_path):
+    cache = PredictionCache(maxsize=100, path=str(tmp_path / "prediction_cache.db"))
+    expected = predict_batch(patients, model, cache=None).drop(columns="MODEL_VERSION")
+    for regressors in (dict(model), LoadedModel(dict(model))):
+        preds = predict_batch(patients, regressors, cache=cache)
+        assert preds["MODEL_VERSION"].isna().all()
+        assert preds.drop(columns="MODEL_VERSION").equals(expected)
+    assert cache.stats()["batches"] == 0
+    assert len(cache.memory) == 0
+    assert not (tmp_path / "prediction_cache.db").exists()
@@ -0,0 +1,43 @@
+"""
+Streaming patient exports: label-by-label order and Parquet values that match
+the database exactly.
+"""
+
+import pandas as pd
+import pytest
+from benchmarks.common import make_synthetic_patients
+from risk.export import EXPORT_COLUMNS, iter_export_batches, write_parquet
+from risk.migrations import apply_migrations
+
+@pytest.fixture
+def exported(database):
+    df = make_synthetic_patients(60, seed=9)
+    # As loaded from CSV: REAL ages and risks, some not whole numbers
+    df = df.astype({"AGE": float, "RISK_30D": float})
+    df.loc[0, "AGE"] = 99.5
+    df.loc[1, "RISK_30D"] = 42.5
+    df["RISK_LABEL"] = ["High Risk", "Low Risk", "Moderate Risk"] * 20
+    df["EMAIL"] = None
+    engine = database.get_engine()
+    df.to_sql("risk_training", engine, index=False)
+    apply_migrations(engine, "risk_training")
+    return engine
+
+def test_labels_stream_in_turn(exported):
+    labels = ["Low Risk", "High Risk"]
+    rows = [row for batch in iter_export_batches(batch_size=7, risk_labels=labels) for row in batch]
+    expected = pd.concat(
+        pd.read_sql(f"SELECT DESYNPUF_ID FROM risk_training WHERE RISK_LABEL = '{label}' "
+                    f"ORDER BY RISK_30D DESC, DESYNPUF_ID", exported) for label in labels)
+    assert [row[0] for row in rows] == expected["DESYNPUF_ID"].tolist()
+
+def test_parquet_keeps_real_values(exported, tmp_path):
+    pytest.importorskip("pyarrow")
+    path = tmp_path / "patients.parquet"
+    assert write_parquet(str(path), iter_export_batches(batch_size=25)) == 60
+    got = pd.read_parquet(path).set_index("DESYNPUF_ID").sort_index()
+    expected = pd.read_sql(f"SELECT {', '.join(EXPORT_COLUMNS)} FROM risk_training", exported)
+    expected = expected.set_index("DESYNPUF_ID").sort_index()
+    assert got.loc[:, "AGE"].max() == 99.5 and 42.5 in got["RISK_30D"].tolist()
+    pd.testing.assert_frame_equal(got[["AGE", "GENDER", "RISK_30D", "RISK_60D", "RISK_90D"]],
+                                  expected[["AGE", "GENDER", "RISK_30D", "RISK_60D", "RISK_90D"]].astype(float))
@@ -0,0 +1,27 @@
+"""
+Memoized recommendations must follow the rule tables: editing a table in place
+fails, and replacing one drops the recommendations built from the old rules.
+"""
+
+import pytest
+from risk.recommendations import InterventionRecommender
+
+def test_rule_tables_are_read_only():
+    recommender = InterventionRecommender()
+    with pytest.raises(TypeError):
+        recommender.risk_thresholds['AGE']['high_risk'] = 80
+    with pytest.raises(TypeError):
+        recommender.feature_mapping['AGE'] = 'AGE_YEARS'
+    with pytest.raises(AttributeError):
+        recommender.intervention_map['AGE']['high_risk'].append("Home visit")
+
+def test_replacing_a_table_invalidates_cache():
+    recommender = InterventionRecommender()
+    patient = {'AGE': 78}
+    before = recommender.generate_recommendations(patient, 'AGE, BMI')
+    assert before[0] == "Schedule comprehensive geriatric assessment"
+
+    thresholds = {feature: dict(levels) for feature, levels in recommender.risk_thresholds.items()}
+    thresholds['AGE']['high_risk'] = 80
+    recommender.risk_thresholds = thresholds
+    assert recommender.generate_recommendations(patient, 'AGE, BMI')[0] == "Annual wellness visit recommended"
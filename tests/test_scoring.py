@@ -0,0 +1,58 @@
+"""
+iter_predictions must give the same rows whatever the worker count, with
+predict_batch options reaching the pool workers too; an interrupted run must
+resume where it stopped.
+"""
+
+import pandas as pd
+import pytest
+from benchmarks.common import make_synthetic_patients
+from risk import scoring
+from risk.model import PredictionCache
+from risk.scoring import iter_predictions
+
+@pytest.mark.parametrize("predict_kwargs", [
+    {"with_contributions": True},
+    {"compiled": True, "cache": None},
+    {"cache": PredictionCache(maxsize=100)},
+])
+def test_workers_get_predict_kwargs(model, predict_kwargs):
+    chunks = [make_synthetic_patients(200, seed=seed) for seed in (1, 2)]
+    serial = list(iter_predictions(chunks, model, workers=1, **predict_kwargs))
+    pooled = list(iter_predictions(chunks, model, workers=2, **predict_kwargs))
+    for expected, got in zip(serial, pooled):
+        assert list(got.columns) == list(expected.columns)
+        assert got.reset_index(drop=True).equals(expected.reset_index(drop=True))
+
+def test_resume_continues_inside_a_run_of_duplicate_ids(database, model, monkeypatch):
+    df = make_synthetic_patients(30)
+    df.loc[3:12, "DESYNPUF_ID"] = "0" * 16  # first in scan order, ten rows long
+    df.to_sql("risk_training", database.get_engine(), index=False)
+
+    written = []
+    def write(preds, table_name):
+        if len(written) == 1:
+            raise RuntimeError("disk full")
+        written.append(preds.index.tolist())
+    monkeypatch.setattr(scoring, "update_predictions_in_db_bulk", write)
+
+    # The first chunk ends partway through the duplicates and the second one fails
+    with pytest.raises(RuntimeError):
+        scoring.score_table("risk_training", model=model, chunk_size=7)
+    checkpoint = database.read_scoring_checkpoint("risk_training", "")
+    assert checkpoint["status"] == "failed" and checkpoint["rows_done"] == 7
+    assert checkpoint["last_id"] == "0" * 16 and checkpoint["last_rowid"] == 10
+
+    written.append([])  # let the resumed run write
+    assert scoring.score_table("risk_training", model=model, chunk_size=7) == 23
+    rowids = [rowid for chunk in written for rowid in chunk]
+    expected = pd.read_sql("SELECT rowid FROM risk_training ORDER BY DESYNPUF_ID, rowid", database.get_engine())
+    assert rowids == expected["rowid"].tolist()
+
+def test_stale_rerun_of_unversioned_model_scores_nothing(database, model):
+    make_synthetic_patients(50).to_sql("risk_training", database.get_engine(), index=False)
+    plain = dict(model)  # e.g. straight from load_model, no registry version
+    assert scoring.score_table("risk_training", model=plain, mode="stale") == 50
+    stamps = pd.read_sql("SELECT DISTINCT MODEL_VERSION FROM risk_training", database.get_engine())
+    assert stamps["MODEL_VERSION"].notna().all() and len(stamps) == 1
+    assert scoring.score_table("risk_training", model=plain, mode="stale") == 0
@@ -94,15 +94,32 @@ if __name__ == "__main__":
     train_model(df)
 """
 
+import argparse
 import pandas as pd
-from risk.model import train_models, save_model
+from risk.model import train_models, save_model, export_model, check_export_equivalence, MODEL_PATH, ENGINES
+from risk.preprocess import preprocess_features, feature_cols
 from risk.db import load_data_from_db
 from risk.logger import logger
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the risk models")
+    parser.add_argument("--engine", choices=ENGINES, default="separate",
+                        help="one pipeline per horizon, or a single multi-output forest")
+    parser.add_argument("--fold-scaler", action="store_true",
+                        help="fold StandardScaler into the tree thresholds so inference skips it")
+    args = parser.parse_args()
+
     table_name = "risk_training"
     logger.info("Loading data for training...")
     df = load_data_from_db(table_name)
-    regressors = train_models(df)
-    save_model(regressors, "models/risk_model.pkl")
+    regressors = train_models(df, engine=args.engine)
+
+    if args.fold_scaler:
+        exported = export_model(regressors)
+        X = preprocess_features(df)[feature_cols].values
+        max_diff = check_export_equivalence(regressors, exported, X)
+        logger.info(f"Scaler folded into thresholds; predictions match on {len(X)} rows (max diff {max_diff:.3g})")
+        regressors = exported
+
+    save_model(regressors, MODEL_PATH)
     logger.success("Model trained & saved")